@@ -1,6 +1,11 @@
 import { GoogleGenAI } from "@google/genai";
 import OpenAI from "openai";
+import { genaiClient } from "./genai-client";
+import { getOpenAIClient } from "./openai";
+import { createHash } from "crypto";
 import type { KnowledgeItemWithTags, UserAiSettings } from "@shared/schema";
+import { BoundedCache } from "./bounded-cache";
+import { SemanticCache } from "./semantic-cache";
 
 export interface AiProvider {
   generateResponse(
@@ -13,7 +18,7 @@ export interface AiProvider {
     prompt: string,
     context: string,
     settings?: any,
-    onChunk?: (chunk: string) => void
+    onChunk?: (chunk: string) => void | Promise<void>
   ): Promise<string>;
 }
 
@@ -30,77 +35,76 @@ export interface StreamingRagResponse {
   provider: string;
 }
 
-export class GeminiProvider implements AiProvider {
-  private ai: GoogleGenAI;
-  
-  constructor(apiKey: string) {
-    this.ai = new GoogleGenAI({ apiKey });
-  }
-
-  async generateResponse(
-    prompt: string, 
-    context: string, 
-    settings: any = {}
-  ): Promise<string> {
-    const { model = "gemini-2.5-flash", temperature = 0.7 } = settings;
-    
-    const systemPrompt = `You are a knowledgeable AI assistant helping users understand their personal knowledge base. Use the provided context to answer questions accurately and comprehensively.
+// Static RAG instructions, built once at module load. Keeping a single copy
+// also guarantees the prompt stays byte-identical across providers and calls.
+const RAG_SYSTEM_INSTRUCTIONS = `You are a knowledgeable AI assistant helping users understand their personal knowledge base. Use the provided context to answer questions accurately and comprehensively.
 
 IMPORTANT INSTRUCTIONS:
 - Base your answers primarily on the provided context
 - If the context doesn't contain enough information, clearly state this
 - Be conversational and helpful
 - Cite specific sources when possible
-- If asked about something not in the context, politely explain the limitation
-
-Context from knowledge base:
+- If asked about something not in the context, politely explain the limitation`;
+
+// Prompts are ordered stable-prefix-first so provider-side prompt caching
+// can reuse the prefill across calls: the byte-identical instructions lead,
+// the context (stable across turns in one conversation) follows, and only
+// the user question varies at the tail. Interleaving anything variable ahead
+// of the instructions would invalidate the cached prefix on every call.
+function buildGeminiUserContent(context: string, prompt: string): string {
+  return `Context from knowledge base:
 ${context}
 
 User question: ${prompt}
 
 Please provide a helpful and accurate response based on the available context.`;
+}
 
-    try {
-      const response = await this.ai.models.generateContent({
-        model,
-        contents: systemPrompt,
-      });
+function buildOpenAiSystemMessage(context: string): string {
+  return `${RAG_SYSTEM_INSTRUCTIONS}
 
-      return response.text || "I'm sorry, I couldn't generate a response.";
-    } catch (error) {
-      console.error("Gemini API error:", error);
-      throw new Error(`Gemini API error: ${error}`);
-    }
+Context from knowledge base:
+${context}`;
+}
+
+export class GeminiProvider implements AiProvider {
+  private ai: GoogleGenAI;
+  
+  constructor(apiKey: string) {
+    // Users on the server's default key share the process-wide client (and
+    // its warm connection pool); only custom keys get their own instance
+    this.ai =
+      apiKey === (process.env.GEMINI_API_KEY || "")
+        ? genaiClient
+        : new GoogleGenAI({ apiKey });
+  }
+
+  // The buffered variant is just the streaming call without a chunk
+  // consumer - one request path to maintain, and both benefit from any
+  // upstream fix the same way
+  async generateResponse(
+    prompt: string, 
+    context: string, 
+    settings: any = {}
+  ): Promise<string> {
+    return this.generateStreamingResponse(prompt, context, settings);
   }
 
   async generateStreamingResponse(
     prompt: string,
     context: string,
     settings: any = {},
-    onChunk?: (chunk: string) => void
+    onChunk?: (chunk: string) => void | Promise<void>
   ): Promise<string> {
     const { model = "gemini-2.5-flash", temperature = 0.7 } = settings;
-    
-    const systemPrompt = `You are a knowledgeable AI assistant helping users understand their personal knowledge base. Use the provided context to answer questions accurately and comprehensively.
-
-IMPORTANT INSTRUCTIONS:
-- Base your answers primarily on the provided context
-- If the context doesn't contain enough information, clearly state this
-- Be conversational and helpful
-- Cite specific sources when possible
-- If asked about something not in the context, politely explain the limitation
-
-Context from knowledge base:
-${context}
-
-User question: ${prompt}
-
-Please provide a helpful and accurate response based on the available context.`;
 
     try {
       const response = await this.ai.models.generateContentStream({
         model,
-        contents: systemPrompt,
+        // The static instructions travel as systemInstruction so Gemini's
+        // implicit context caching sees an identical prefix on every call
+        config: { systemInstruction: RAG_SYSTEM_INSTRUCTIONS },
+        contents: buildGeminiUserContent(context, prompt),
       });
 
       let fullResponse = "";
@@ -108,7 +112,10 @@ Please provide a helpful and accurate response based on the available context.`;
         const text = chunk.text;
         if (text) {
           fullResponse += text;
-          onChunk?.(text);
+          // Awaiting the consumer pauses this loop - and with it the model
+          // stream - whenever the downstream sink signals backpressure, so a
+          // slow client bounds how far ahead of it we read
+          await onChunk?.(text);
         }
       }
 
@@ -124,55 +131,29 @@ export class OpenAIProvider implements AiProvider {
   private openai: OpenAI;
   
   constructor(apiKey: string) {
-    this.openai = new OpenAI({ apiKey });
+    // Same arrangement as the Gemini provider: the server-wide key shares
+    // the warm process client, custom keys get their own instance
+    this.openai =
+      apiKey === process.env.OPENAI_API_KEY
+        ? getOpenAIClient()
+        : new OpenAI({ apiKey });
   }
 
+  // Same single-code-path arrangement as the Gemini provider: buffered is
+  // streaming without a consumer
   async generateResponse(
     prompt: string, 
     context: string, 
     settings: any = {}
   ): Promise<string> {
-    const { model = "gpt-4o", temperature = 0.7, maxTokens = 1000 } = settings;
-    
-    try {
-      const response = await this.openai.chat.completions.create({
-        model,
-        temperature,
-        max_tokens: maxTokens,
-        messages: [
-          {
-            role: "system",
-            content: `You are a knowledgeable AI assistant helping users understand their personal knowledge base. Use the provided context to answer questions accurately and comprehensively.
-
-IMPORTANT INSTRUCTIONS:
-- Base your answers primarily on the provided context
-- If the context doesn't contain enough information, clearly state this
-- Be conversational and helpful
-- Cite specific sources when possible
-- If asked about something not in the context, politely explain the limitation
-
-Context from knowledge base:
-${context}`
-          },
-          {
-            role: "user",
-            content: prompt
-          }
-        ],
-      });
-
-      return response.choices[0]?.message?.content || "I'm sorry, I couldn't generate a response.";
-    } catch (error) {
-      console.error("OpenAI API error:", error);
-      throw new Error(`OpenAI API error: ${error}`);
-    }
+    return this.generateStreamingResponse(prompt, context, settings);
   }
 
   async generateStreamingResponse(
     prompt: string,
     context: string,
     settings: any = {},
-    onChunk?: (chunk: string) => void
+    onChunk?: (chunk: string) => void | Promise<void>
   ): Promise<string> {
     const { model = "gpt-4o", temperature = 0.7, maxTokens = 1000 } = settings;
     
@@ -185,17 +166,7 @@ ${context}`
         messages: [
           {
             role: "system",
-            content: `You are a knowledgeable AI assistant helping users understand their personal knowledge base. Use the provided context to answer questions accurately and comprehensively.
-
-IMPORTANT INSTRUCTIONS:
-- Base your answers primarily on the provided context
-- If the context doesn't contain enough information, clearly state this
-- Be conversational and helpful
-- Cite specific sources when possible
-- If asked about something not in the context, politely explain the limitation
-
-Context from knowledge base:
-${context}`
+            content: buildOpenAiSystemMessage(context)
           },
           {
             role: "user",
@@ -209,7 +180,8 @@ ${context}`
         const content = chunk.choices[0]?.delta?.content;
         if (content) {
           fullResponse += content;
-          onChunk?.(content);
+          // Same backpressure contract as the Gemini provider
+          await onChunk?.(content);
         }
       }
 
@@ -221,25 +193,66 @@ ${context}`
   }
 }
 
+// Short questions with no retrieved context don't need the heavyweight
+// models - a smaller sibling answers them indistinguishably at a fraction of
+// the latency and cost, keeping the big model for reasoning over real context
+const CHEAP_MODEL_BY_EXPENSIVE: Record<string, string> = {
+  "gpt-4o": "gpt-4o-mini",
+  "gemini-2.5-pro": "gemini-2.5-flash",
+};
+const SIMPLE_PROMPT_MAX_WORDS = 48;
+
+function routeModel(model: string, userQuestion: string, contextItems: number): string {
+  if (contextItems > 0) return model;
+  const cheap = CHEAP_MODEL_BY_EXPENSIVE[model];
+  if (!cheap) return model;
+  const words = userQuestion.trim().split(/\s+/).length;
+  return words <= SIMPLE_PROMPT_MAX_WORDS ? cheap : model;
+}
+
 export class AiService {
   private defaultGeminiKey: string;
-  
+  private responseCache: SemanticCache<string>;
+  // Bounded so users cycling through custom API keys can't grow this forever
+  private providerCache = new BoundedCache<string, AiProvider>(64);
+  // Identical questions over identical context that arrive while a response
+  // is still being generated share the in-flight call instead of each paying
+  // for their own; entries vanish as soon as the promise settles
+  private inflightResponses = new Map<string, Promise<string>>();
+
   constructor() {
     this.defaultGeminiKey = process.env.GEMINI_API_KEY || "";
+    this.responseCache = new SemanticCache<string>();
   }
 
+  // Providers are cached per (provider, key) so the underlying HTTP clients
+  // and their keep-alive connection pools are reused across requests instead
+  // of paying a fresh TCP/TLS handshake on every call
   private getProvider(provider: string, apiKey?: string): AiProvider {
-    switch (provider.toLowerCase()) {
+    const name = provider.toLowerCase();
+    const key = name === "gemini" ? apiKey || this.defaultGeminiKey : apiKey;
+
+    if (name === "openai" && !key) {
+      throw new Error("OpenAI requires a custom API key");
+    }
+
+    const cacheKey = `${name}:${key}`;
+    let instance = this.providerCache.get(cacheKey);
+    if (instance) return instance;
+
+    switch (name) {
       case "gemini":
-        return new GeminiProvider(apiKey || this.defaultGeminiKey);
+        instance = new GeminiProvider(key!);
+        break;
       case "openai":
-        if (!apiKey) {
-          throw new Error("OpenAI requires a custom API key");
-        }
-        return new OpenAIProvider(apiKey);
+        instance = new OpenAIProvider(key!);
+        break;
       default:
         throw new Error(`Unsupported AI provider: ${provider}`);
     }
+
+    this.providerCache.set(cacheKey, instance);
+    return instance;
   }
 
   async generateRagResponse(
@@ -249,7 +262,7 @@ export class AiService {
   ): Promise<RagResponse> {
     // Use user settings or fallback to defaults
     const provider = userSettings?.preferredProvider || "gemini";
-    const model = userSettings?.preferredModel || "gemini-2.5-flash";
+    const preferredModel = userSettings?.preferredModel || "gemini-2.5-flash";
     const chatSettings = userSettings?.chatSettings || {};
     const customApiKeys = userSettings?.customApiKeys as any;
     
@@ -259,16 +272,42 @@ export class AiService {
       apiKey = customApiKeys[provider];
     }
 
+    const model = routeModel(preferredModel, userQuestion, relevantItems.length);
+
     // Create context from relevant knowledge items
     const context = this.createContext(relevantItems);
-    
-    // Get the AI provider and generate response
+
+    // Scope cache entries by provider/model and the exact context, so the same
+    // question against different knowledge doesn't collide
+    const cacheScope = `chat:${provider}:${model}:${createHash("sha256").update(context).digest("hex")}`;
+
+    // Near-duplicate questions over the same context skip the LLM entirely;
+    // the embedding rides along so the store after generation reuses it
+    const { value: cached, embedding: questionEmbedding } =
+      await this.responseCache.lookup(userQuestion, cacheScope);
+    if (cached) {
+      return {
+        response: cached,
+        sources: relevantItems,
+        model,
+        provider,
+      };
+    }
+
+    // Get the AI provider and generate response, coalescing concurrent
+    // duplicates (retry storms, double-submits) onto one model call
     const aiProvider = this.getProvider(provider, apiKey);
-    const response = await aiProvider.generateResponse(
-      userQuestion,
-      context,
-      { model, ...chatSettings }
-    );
+    const flightKey = `${cacheScope}\u0000${userQuestion}`;
+    let pending = this.inflightResponses.get(flightKey);
+    if (!pending) {
+      pending = aiProvider
+        .generateResponse(userQuestion, context, { model, ...chatSettings })
+        .finally(() => this.inflightResponses.delete(flightKey));
+      this.inflightResponses.set(flightKey, pending);
+    }
+    const response = await pending;
+
+    await this.responseCache.put(userQuestion, cacheScope, response, questionEmbedding);
 
     return {
       response,
@@ -282,11 +321,11 @@ export class AiService {
     userQuestion: string,
     relevantItems: KnowledgeItemWithTags[],
     userSettings?: UserAiSettings,
-    onChunk?: (chunk: string) => void
+    onChunk?: (chunk: string) => void | Promise<void>
   ): Promise<StreamingRagResponse> {
     // Use user settings or fallback to defaults
     const provider = userSettings?.preferredProvider || "gemini";
-    const model = userSettings?.preferredModel || "gemini-2.5-flash";
+    const preferredModel = userSettings?.preferredModel || "gemini-2.5-flash";
     const chatSettings = userSettings?.chatSettings || {};
     const customApiKeys = userSettings?.customApiKeys as any;
     
@@ -296,18 +335,44 @@ export class AiService {
       apiKey = customApiKeys[provider];
     }
 
+    const model = routeModel(preferredModel, userQuestion, relevantItems.length);
+
     // Create context from relevant knowledge items
     const context = this.createContext(relevantItems);
-    
-    // Get the AI provider and generate streaming response
+
+    // Same semantic cache as the buffered path (identical scope format, so
+    // the two share entries). A hit is replayed as a single chunk so the
+    // client sees the usual streaming protocol, just all at once.
+    const cacheScope = `chat:${provider}:${model}:${createHash("sha256").update(context).digest("hex")}`;
+    const { value: cached, embedding: questionEmbedding } =
+      await this.responseCache.lookup(userQuestion, cacheScope);
+    if (cached) {
+      await onChunk?.(cached);
+      return {
+        sources: relevantItems,
+        model,
+        provider,
+      };
+    }
+
+    // Get the AI provider and generate streaming response, accumulating the
+    // full text so the finished answer lands in the cache too
     const aiProvider = this.getProvider(provider, apiKey);
+    let fullResponse = "";
     await aiProvider.generateStreamingResponse(
       userQuestion,
       context,
       { model, ...chatSettings },
-      onChunk
+      async (chunk) => {
+        fullResponse += chunk;
+        await onChunk?.(chunk);
+      }
     );
 
+    if (fullResponse) {
+      await this.responseCache.put(userQuestion, cacheScope, fullResponse, questionEmbedding);
+    }
+
     return {
       sources: relevantItems,
       model,
@@ -315,18 +380,45 @@ export class AiService {
     };
   }
 
+  // Context strings are deterministic in the item set, and consecutive chat
+  // turns usually retrieve the same sources, so the last few built contexts
+  // are kept keyed by item ids + updatedAt. An edited item changes its
+  // updatedAt and therefore misses, so stale text is never reused.
+  private contextCache = new BoundedCache<string, string>(32);
+
   private createContext(items: KnowledgeItemWithTags[]): string {
     if (items.length === 0) {
       return "No relevant information found in the knowledge base.";
     }
 
-    return items
-      .map((item, index) => {
-        const tags = item.knowledgeItemTags?.map(kt => kt.tag.name).join(", ") || "";
-        const metadata = item.metadata as any;
-        const category = metadata?.category || "";
-        
-        return `[Source ${index + 1}]
+    const cacheKey = items
+      .map(item => `${item.id}:${item.updatedAt ?? ""}`)
+      .join("|");
+    const cached = this.contextCache.get(cacheKey);
+    if (cached !== undefined) {
+      return cached;
+    }
+
+    const context = this.buildContext(items);
+    this.contextCache.set(cacheKey, context);
+    return context;
+  }
+
+  // Roughly 4k tokens of context. Cost and prefill latency grow with every
+  // context token, so the block list stops once the budget is spent - items
+  // arrive ranked, so whatever gets cut was the least relevant anyway.
+  private static readonly CONTEXT_CHAR_BUDGET = 16_000;
+
+  private buildContext(items: KnowledgeItemWithTags[]): string {
+    const blocks: string[] = [];
+    let used = 0;
+
+    for (const [index, item] of items.entries()) {
+      const tags = item.knowledgeItemTags?.map(kt => kt.tag.name).join(", ") || "";
+      const metadata = item.metadata as any;
+      const category = metadata?.category || "";
+
+      const block = `[Source ${index + 1}]
 Title: ${item.title}
 Type: ${item.type}
 ${category ? `Category: ${category}` : ""}
@@ -334,8 +426,15 @@ ${tags ? `Tags: ${tags}` : ""}
 Summary: ${item.summary || "No summary available"}
 ${item.content ? `Content: ${item.content.slice(0, 500)}${item.content.length > 500 ? "..." : ""}` : ""}
 ---`;
-      })
-      .join("\n\n");
+
+      if (blocks.length > 0 && used + block.length > AiService.CONTEXT_CHAR_BUDGET) {
+        break;
+      }
+      blocks.push(block);
+      used += block.length;
+    }
+
+    return blocks.join("\n\n");
   }
 
   // Get available models for a provider
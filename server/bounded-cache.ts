@@ -0,0 +1,48 @@
+// Small LRU cache with an optional per-entry TTL, shared by the server's
+// long-lived caches. Several modules had grown their own "Map plus manual
+// eviction" variants - and a couple of maps had no bound at all, which in a
+// long-lived process is a slow leak. One implementation keeps every cache
+// bounded and the eviction policy consistent.
+//
+// Map preserves insertion order, so recency is tracked by re-inserting an
+// entry on access: the first key is always the least recently used.
+export class BoundedCache<K, V> {
+  private entries = new Map<K, { value: V; expiresAt: number }>();
+
+  constructor(
+    private maxSize: number,
+    private ttlMs?: number,
+  ) {}
+
+  get(key: K): V | undefined {
+    const entry = this.entries.get(key);
+    if (!entry) return undefined;
+    if (entry.expiresAt < Date.now()) {
+      this.entries.delete(key);
+      return undefined;
+    }
+    // Touch: move to the most-recently-used position
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    return entry.value;
+  }
+
+  delete(key: K): void {
+    this.entries.delete(key);
+  }
+
+  set(key: K, value: V): void {
+    if (this.entries.has(key)) {
+      this.entries.delete(key);
+    } else if (this.entries.size >= this.maxSize) {
+      const oldest = this.entries.keys().next().value;
+      if (oldest !== undefined) {
+        this.entries.delete(oldest);
+      }
+    }
+    this.entries.set(key, {
+      value,
+      expiresAt: this.ttlMs ? Date.now() + this.ttlMs : Infinity,
+    });
+  }
+}
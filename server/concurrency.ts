@@ -0,0 +1,60 @@
+// Minimal counting semaphore for bounding concurrent work. Tasks beyond the
+// permit count queue in FIFO order instead of all running at once, which keeps
+// bursty traffic from exhausting memory or upstream rate limits.
+export class Semaphore {
+  private available: number;
+  private waiters: Array<() => void> = [];
+
+  constructor(permits: number) {
+    this.available = Math.max(1, permits);
+  }
+
+  async acquire(): Promise<void> {
+    if (this.available > 0) {
+      this.available--;
+      return;
+    }
+    await new Promise<void>(resolve => this.waiters.push(resolve));
+  }
+
+  release(): void {
+    const next = this.waiters.shift();
+    if (next) {
+      // Hand the permit directly to the next waiter
+      next();
+    } else {
+      this.available++;
+    }
+  }
+
+  async run<T>(task: () => Promise<T>): Promise<T> {
+    await this.acquire();
+    try {
+      return await task();
+    } finally {
+      this.release();
+    }
+  }
+}
+
+// Single-flight wrapper: identical calls that arrive while one is already in
+// flight await the same promise instead of doing the work again. Unlike a
+// cache, nothing is retained once the call settles - this only collapses
+// concurrent duplicates (retry storms, multiple tabs firing the same query).
+export function singleFlight<Args extends unknown[], T>(
+  fn: (...args: Args) => Promise<T>,
+  keyOf: (...args: Args) => string,
+): (...args: Args) => Promise<T> {
+  const inflight = new Map<string, Promise<T>>();
+  return (...args: Args) => {
+    const key = keyOf(...args);
+    const pending = inflight.get(key);
+    if (pending) return pending;
+
+    const promise = fn(...args).finally(() => {
+      inflight.delete(key);
+    });
+    inflight.set(key, promise);
+    return promise;
+  };
+}
@@ -4,6 +4,13 @@ import ws from "ws";
 import * as schema from "@shared/schema";
 
 neonConfig.webSocketConstructor = ws;
+// Pipeline WebSocket connection startup so auth rides along with the first
+// query's round trip - a cold connection costs one RTT instead of three
+neonConfig.pipelineConnect = "password";
+// Route single queries outside a transaction over plain fetch: no socket
+// setup at all, which is the cheap path for the many one-shot reads the
+// storage layer issues per request
+neonConfig.poolQueryViaFetch = true;
 
 if (!process.env.DATABASE_URL) {
   throw new Error(
@@ -11,5 +18,15 @@ if (!process.env.DATABASE_URL) {
   );
 }
 
-export const pool = new Pool({ connectionString: process.env.DATABASE_URL });
+// Explicit pool sizing instead of driver defaults: enough connections to
+// ride out request bursts without exhausting Neon's connection budget
+// (remember each cluster worker gets its own pool), idle connections are
+// released promptly, and a connection that can't be established in 10s
+// surfaces as an error instead of queueing callers indefinitely.
+export const pool = new Pool({
+  connectionString: process.env.DATABASE_URL,
+  max: parseInt(process.env.DB_POOL_MAX || "10", 10),
+  idleTimeoutMillis: 30_000,
+  connectionTimeoutMillis: 10_000,
+});
 export const db = drizzle({ client: pool, schema });
\ No newline at end of file
@@ -1,5 +1,13 @@
 import * as fs from "fs";
-import { GoogleGenAI, Modality } from "@google/genai";
+import { createHash } from "crypto";
+import { Modality } from "@google/genai";
+import { genaiClient } from "./genai-client";
+import memoize from "memoizee";
+import { Semaphore, singleFlight } from "./concurrency";
+import { BoundedCache } from "./bounded-cache";
+import { parseModelJson } from "./model-json";
+import { transcribeAudio as transcribeWithWhisper } from "./openai";
+import { SemanticCache } from "./semantic-cache";
 
 // DON'T DELETE THIS COMMENT
 // Follow these instructions when using this blueprint:
@@ -7,21 +15,48 @@ import { GoogleGenAI, Modality } from "@google/genai";
 //   - do not change this unless explicitly requested by the user
 
 // This API key is from Gemini Developer API Key, not vertex AI API Key
-const ai = new GoogleGenAI({ apiKey: process.env.GEMINI_API_KEY || "" });
+const ai = genaiClient;
+
+// Cap in-flight Gemini calls from this module. Unbounded fan-out under burst
+// load trips provider rate limits, and the resulting retries only add more
+// pressure; queueing excess calls keeps throughput at the ceiling while
+// flattening tail latency.
+const geminiLimit = new Semaphore(parseInt(process.env.MAX_INFLIGHT_GEMINI || "16", 10));
+
+// Rate limits, upstream 5xx, and dropped connections are transient - one or
+// two spaced retries absorb most of them instead of surfacing every blip to
+// the user. Jitter keeps a burst of failed callers from retrying in lockstep.
+const MAX_TRANSIENT_RETRIES = 2;
+const RETRY_BASE_DELAY_MS = 500;
+
+function isTransientError(error: unknown): boolean {
+  const status = (error as any)?.status ?? (error as any)?.code;
+  if (status === 429 || (typeof status === "number" && status >= 500)) {
+    return true;
+  }
+  const message = error instanceof Error ? error.message : String(error);
+  return /rate limit|timeout|fetch failed|ECONNRESET|socket hang up|overloaded|unavailable/i.test(message);
+}
 
-export interface ProcessedContent {
-  title: string;
-  summary: string;
-  tags: string[];
-  category: string;
-  thumbnailUrl?: string;
-  metadata?: {
-    videoId?: string;
-    duration?: string;
-    platform?: string;
-    dimensions?: { width: number; height: number };
-    [key: string]: any;
-  };
+function delay(ms: number): Promise<void> {
+  return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function generateContent(request: Parameters<typeof ai.models.generateContent>[0]) {
+  let lastError: unknown;
+  for (let attempt = 0; attempt <= MAX_TRANSIENT_RETRIES; attempt++) {
+    if (attempt > 0) {
+      // Exponential backoff with full jitter
+      await delay(RETRY_BASE_DELAY_MS * 2 ** (attempt - 1) * Math.random());
+    }
+    try {
+      return await geminiLimit.run(() => ai.models.generateContent(request));
+    } catch (error) {
+      lastError = error;
+      if (!isTransientError(error)) throw error;
+    }
+  }
+  throw lastError;
 }
 
 export interface ProcessedContent {
@@ -39,9 +74,52 @@ export interface ProcessedContent {
   };
 }
 
-export async function processImageWithGemini(base64Image: string, fileName?: string): Promise<ProcessedContent> {
-  try {
-    const systemPrompt = `You are an AI assistant that analyzes images for a personal knowledge management system. Create concise, clear content descriptions optimized for search and knowledge retrieval.
+// System prompts and response schemas are constant per content type, so they
+// are built once at module load instead of being reallocated on every call -
+// and a byte-identical instruction prefix is what provider-side prompt
+// caching keys on.
+const METADATA_SCHEMA_FIELDS = {
+  title: { type: "string" },
+  summary: { type: "string" },
+  tags: { 
+    type: "array",
+    items: { type: "string" }
+  },
+  category: { type: "string" }
+};
+
+const METADATA_RESPONSE_SCHEMA = {
+  type: "object",
+  properties: METADATA_SCHEMA_FIELDS,
+  required: ["title", "summary", "tags", "category"],
+};
+
+const IMAGE_RESPONSE_SCHEMA = {
+  type: "object",
+  properties: {
+    ...METADATA_SCHEMA_FIELDS,
+    suggestedFileName: { type: "string" }
+  },
+  required: ["title", "summary", "tags", "category"],
+};
+
+const LINK_RESPONSE_SCHEMA = {
+  type: "object",
+  properties: {
+    ...METADATA_SCHEMA_FIELDS,
+    metadata: {
+      type: "object",
+      properties: {
+        domain: { type: "string" },
+        platform: { type: "string" },
+        videoId: { type: "string" }
+      }
+    }
+  },
+  required: ["title", "summary", "tags", "category"],
+};
+
+const IMAGE_SYSTEM_PROMPT = `You are an AI assistant that analyzes images for a personal knowledge management system. Create concise, clear content descriptions optimized for search and knowledge retrieval.
 
 CRITICAL REQUIREMENTS:
 - Summary must be under 70 words
@@ -64,6 +142,60 @@ Respond with JSON in this exact format:
   "suggestedFileName": "clean_filename_without_spaces"
 }`;
 
+const TEXT_SYSTEM_PROMPT = `You are an AI assistant that processes text content for a personal knowledge management system. Analyze the provided text and extract a concise title, summary, relevant tags, and category.
+
+CRITICAL REQUIREMENTS:
+- Summary must be under 70 words
+- Title should be descriptive and concise
+- Tags should be relevant and searchable
+- Category should be meaningful
+
+Respond with JSON in this exact format:
+{
+  "title": "specific descriptive title",
+  "summary": "concise summary under 70 words",
+  "tags": ["tag1", "tag2", "tag3"],
+  "category": "category name"
+}`;
+
+const LINK_SYSTEM_PROMPT = `You are an AI assistant that analyzes web links for a personal knowledge management system. Analyze the provided URL and extract metadata about it.
+
+CRITICAL REQUIREMENTS:
+- Summary must be under 70 words
+- Extract meaningful information from the URL structure
+- Generate relevant tags and category
+- Detect video platforms (YouTube, Vimeo, etc.)
+
+Respond with JSON in this exact format:
+{
+  "title": "descriptive title",
+  "summary": "concise description under 70 words",
+  "tags": ["tag1", "tag2", "tag3"],
+  "category": "category name",
+  "metadata": {
+    "domain": "example.com",
+    "platform": "youtube|vimeo|website",
+    "videoId": "id_if_video"
+  }
+}`;
+
+const DOCUMENT_SYSTEM_PROMPT = `You are an AI assistant that analyzes document files for a personal knowledge management system. Based on the filename and type, generate appropriate metadata.
+
+CRITICAL REQUIREMENTS:
+- Summary must be under 70 words
+- Generate relevant tags based on filename and type
+- Categorize appropriately
+
+Respond with JSON in this exact format:
+{
+  "title": "descriptive title",
+  "summary": "concise description under 70 words",
+  "tags": ["tag1", "tag2", "tag3"],
+  "category": "category name"
+}`;
+
+export async function processImageWithGemini(base64Image: string, fileName?: string): Promise<ProcessedContent> {
+  try {
     const contents = [
       {
         inlineData: {
@@ -87,25 +219,12 @@ Filename example: "golden_retriever_playing_park" or "modern_kitchen_marble_coun
       ${fileName ? `\nOriginal file name: ${fileName}` : ""}`,
     ];
 
-    const response = await ai.models.generateContent({
+    const response = await generateContent({
       model: "gemini-2.5-flash",
       config: {
-        systemInstruction: systemPrompt,
+        systemInstruction: IMAGE_SYSTEM_PROMPT,
         responseMimeType: "application/json",
-        responseSchema: {
-          type: "object",
-          properties: {
-            title: { type: "string" },
-            summary: { type: "string" },
-            tags: { 
-              type: "array",
-              items: { type: "string" }
-            },
-            category: { type: "string" },
-            suggestedFileName: { type: "string" }
-          },
-          required: ["title", "summary", "tags", "category"],
-        },
+        responseSchema: IMAGE_RESPONSE_SCHEMA,
       },
       contents: contents,
     });
@@ -114,7 +233,7 @@ Filename example: "golden_retriever_playing_park" or "modern_kitchen_marble_coun
     console.log(`Gemini Raw JSON: ${rawJson}`);
 
     if (rawJson) {
-      const result = JSON.parse(rawJson);
+      const result = parseModelJson(rawJson);
       
       return {
         title: result.title || fileName || "Image Content",
@@ -138,7 +257,7 @@ Filename example: "golden_retriever_playing_park" or "modern_kitchen_marble_coun
 }
 
 export async function analyzeImage(jpegImagePath: string): Promise<string> {
-  const imageBytes = fs.readFileSync(jpegImagePath);
+  const imageBytes = await fs.promises.readFile(jpegImagePath);
 
   const contents = [
     {
@@ -151,7 +270,7 @@ export async function analyzeImage(jpegImagePath: string): Promise<string> {
 and any notable aspects.`,
   ];
 
-  const response = await ai.models.generateContent({
+  const response = await generateContent({
     model: "gemini-2.5-pro",
     contents: contents,
   });
@@ -159,47 +278,73 @@ and any notable aspects.`,
   return response.text || "";
 }
 
+// Metadata extraction only needs enough text to characterize the document,
+// so oversized pastes are clipped to the head plus the tail (openings carry
+// titles and intent, endings carry conclusions) before hitting the model.
+// Unbounded content would otherwise cost seconds of prefill and can overflow
+// the context window outright.
+const MAX_CONTENT_CHARS = 24_000;
+
+function truncateForModel(content: string): string {
+  if (content.length <= MAX_CONTENT_CHARS) return content;
+  const headLength = Math.floor(MAX_CONTENT_CHARS * 0.7);
+  const tailLength = MAX_CONTENT_CHARS - headLength;
+  const head = content.slice(0, headLength);
+  const tail = content.slice(content.length - tailLength);
+  return `${head}\n\n[... content truncated ...]\n\n${tail}`;
+}
+
+// Identical content (retries, re-uploads, duplicate imports) is keyed by its
+// SHA-256 so reprocessing skips the model call entirely; LRU eviction keeps
+// memory flat.
+const processedTextCache = new BoundedCache<string, ProcessedContent>(500);
+
+// Second-chance cache for near-duplicate text: lightly edited re-saves and
+// copy-paste variants miss the exact hash but embed almost identically. The
+// threshold is stricter than the chat cache's because metadata extraction
+// should only be reused for texts that are effectively the same document.
+const processedTextSemanticCache = new SemanticCache<ProcessedContent>({
+  threshold: 0.95,
+  ttlMs: 30 * 60 * 1000,
+});
+
 export async function processTextContent(content: string): Promise<ProcessedContent> {
-  try {
-    const systemPrompt = `You are an AI assistant that processes text content for a personal knowledge management system. Analyze the provided text and extract a concise title, summary, relevant tags, and category.
+  // Truncate before hashing so long documents that share head and tail hit
+  // the same cache entry regardless of the middle
+  content = truncateForModel(content);
+  const cacheKey = createHash("sha256").update(content).digest("hex");
+  const cached = processedTextCache.get(cacheKey);
+  if (cached) {
+    return cached;
+  }
 
-CRITICAL REQUIREMENTS:
-- Summary must be under 70 words
-- Title should be descriptive and concise
-- Tags should be relevant and searchable
-- Category should be meaningful
+  const { value: nearDuplicate, embedding: contentEmbedding } =
+    await processedTextSemanticCache.lookup(content, "process-text");
+  if (nearDuplicate) {
+    processedTextCache.set(cacheKey, nearDuplicate);
+    return nearDuplicate;
+  }
 
-Respond with JSON in this exact format:
-{
-  "title": "specific descriptive title",
-  "summary": "concise summary under 70 words",
-  "tags": ["tag1", "tag2", "tag3"],
-  "category": "category name"
-}`;
+  const result = await processTextContentUncached(content);
+  await processedTextSemanticCache.put(content, "process-text", result, contentEmbedding);
+
+  processedTextCache.set(cacheKey, result);
+  return result;
+}
 
-    const response = await ai.models.generateContent({
+async function processTextContentUncached(content: string): Promise<ProcessedContent> {
+  try {
+    const response = await generateContent({
       model: "gemini-2.5-flash",
       config: {
-        systemInstruction: systemPrompt,
+        systemInstruction: TEXT_SYSTEM_PROMPT,
         responseMimeType: "application/json",
-        responseSchema: {
-          type: "object",
-          properties: {
-            title: { type: "string" },
-            summary: { type: "string" },
-            tags: { 
-              type: "array",
-              items: { type: "string" }
-            },
-            category: { type: "string" }
-          },
-          required: ["title", "summary", "tags", "category"],
-        },
+        responseSchema: METADATA_RESPONSE_SCHEMA,
       },
       contents: `Analyze this text content and provide structured metadata:\n\n${content}`,
     });
 
-    const result = JSON.parse(response.text || "{}");
+    const result = parseModelJson(response.text);
     
     return {
       title: result.title || "Untitled Content",
@@ -213,60 +358,29 @@ Respond with JSON in this exact format:
   }
 }
 
-export async function processLinkContent(url: string): Promise<ProcessedContent> {
+// Link analysis depends only on the URL, and the same link is commonly saved
+// or re-previewed several times in a session. Memoize by exact URL with a TTL
+// so repeats inside the window skip the model; failures are not retained.
+export const processLinkContent = memoize(processLinkContentUncached, {
+  promise: true,
+  primitive: true,
+  max: 500,
+  maxAge: 10 * 60 * 1000,
+});
+
+async function processLinkContentUncached(url: string): Promise<ProcessedContent> {
   try {
-    const systemPrompt = `You are an AI assistant that analyzes web links for a personal knowledge management system. Analyze the provided URL and extract metadata about it.
-
-CRITICAL REQUIREMENTS:
-- Summary must be under 70 words
-- Extract meaningful information from the URL structure
-- Generate relevant tags and category
-- Detect video platforms (YouTube, Vimeo, etc.)
-
-Respond with JSON in this exact format:
-{
-  "title": "descriptive title",
-  "summary": "concise description under 70 words",
-  "tags": ["tag1", "tag2", "tag3"],
-  "category": "category name",
-  "metadata": {
-    "domain": "example.com",
-    "platform": "youtube|vimeo|website",
-    "videoId": "id_if_video"
-  }
-}`;
-
-    const response = await ai.models.generateContent({
+    const response = await generateContent({
       model: "gemini-2.5-flash",
       config: {
-        systemInstruction: systemPrompt,
+        systemInstruction: LINK_SYSTEM_PROMPT,
         responseMimeType: "application/json",
-        responseSchema: {
-          type: "object",
-          properties: {
-            title: { type: "string" },
-            summary: { type: "string" },
-            tags: { 
-              type: "array",
-              items: { type: "string" }
-            },
-            category: { type: "string" },
-            metadata: {
-              type: "object",
-              properties: {
-                domain: { type: "string" },
-                platform: { type: "string" },
-                videoId: { type: "string" }
-              }
-            }
-          },
-          required: ["title", "summary", "tags", "category"],
-        },
+        responseSchema: LINK_RESPONSE_SCHEMA,
       },
       contents: `Analyze this URL and provide structured metadata:\n\nURL: ${url}`,
     });
 
-    const result = JSON.parse(response.text || "{}");
+    const result = parseModelJson(response.text);
     
     return {
       title: result.title || url,
@@ -283,44 +397,17 @@ Respond with JSON in this exact format:
 
 export async function processDocumentContent(filePath: string, fileName: string): Promise<ProcessedContent> {
   try {
-    const systemPrompt = `You are an AI assistant that analyzes document files for a personal knowledge management system. Based on the filename and type, generate appropriate metadata.
-
-CRITICAL REQUIREMENTS:
-- Summary must be under 70 words
-- Generate relevant tags based on filename and type
-- Categorize appropriately
-
-Respond with JSON in this exact format:
-{
-  "title": "descriptive title",
-  "summary": "concise description under 70 words",
-  "tags": ["tag1", "tag2", "tag3"],
-  "category": "category name"
-}`;
-
-    const response = await ai.models.generateContent({
+    const response = await generateContent({
       model: "gemini-2.5-flash",
       config: {
-        systemInstruction: systemPrompt,
+        systemInstruction: DOCUMENT_SYSTEM_PROMPT,
         responseMimeType: "application/json",
-        responseSchema: {
-          type: "object",
-          properties: {
-            title: { type: "string" },
-            summary: { type: "string" },
-            tags: { 
-              type: "array",
-              items: { type: "string" }
-            },
-            category: { type: "string" }
-          },
-          required: ["title", "summary", "tags", "category"],
-        },
+        responseSchema: METADATA_RESPONSE_SCHEMA,
       },
       contents: `Analyze this document and provide structured metadata:\n\nFile name: ${fileName}\nFile path: ${filePath}`,
     });
 
-    const result = JSON.parse(response.text || "{}");
+    const result = parseModelJson(response.text);
     
     return {
       title: result.title || fileName,
@@ -334,77 +421,124 @@ Respond with JSON in this exact format:
   }
 }
 
+// Gemini has no transcription endpoint, so this delegates to Whisper when an
+// OpenAI key is configured. The old placeholder returned filler text that the
+// upload path then paid a full metadata-extraction model call to analyze,
+// producing a junk knowledge item; failing honestly lets the handler surface
+// a real error instead of doing dead work.
 export async function transcribeAudio(filePath: string): Promise<{ text: string }> {
-  // Note: Gemini doesn't have built-in audio transcription
-  // This is a placeholder that returns basic metadata
+  if (!process.env.OPENAI_API_KEY) {
+    throw new Error("Audio transcription requires OPENAI_API_KEY to be configured");
+  }
+  return transcribeWithWhisper(filePath);
+}
+
+// Concurrent identical searches (retry storms, several tabs asking the same
+// thing) collapse onto one in-flight model call instead of each paying for
+// their own. Keyed on the query plus a digest of the item set so a changed
+// knowledge base never reuses a stale ranking.
+export const searchKnowledgeBase = singleFlight(
+  searchKnowledgeBaseCached,
+  (query, items) =>
+    `${query}\u0000${createHash("sha256")
+      .update(items.map(item => item.id).join(","))
+      .digest("hex")}`,
+);
+
+// Rankings for near-duplicate queries are reused from a semantic cache,
+// scoped by a digest of the item set so results are only shared between
+// lookups over the same knowledge base. The cache stores ranked IDs, not
+// items, so hits are re-resolved against the caller's current item objects.
+const searchResultCache = new SemanticCache<string[]>();
+
+// Below this size the ranking call costs more than it saves: the whole
+// knowledge base fits comfortably in the chat model's context, so the extra
+// LLM round-trip only adds latency before generation starts.
+const RANKING_SKIP_THRESHOLD = 8;
+
+async function searchKnowledgeBaseCached(query: string, items: any[]): Promise<any[]> {
+  if (items.length <= RANKING_SKIP_THRESHOLD) {
+    return items;
+  }
+
+  const scope = `search:${createHash("sha256")
+    .update(items.map(item => item.id).join(","))
+    .digest("hex")}`;
+
+  const { value: cachedIds, embedding: queryEmbedding } =
+    await searchResultCache.lookup(query, scope);
+  if (cachedIds) {
+    return cachedIds
+      .map(id => items.find(item => item.id === id))
+      .filter(Boolean);
+  }
+
   try {
-    return {
-      text: `Audio file transcription not available. File: ${filePath}`
-    };
+    const results = await searchKnowledgeBaseUncoalesced(query, items);
+    await searchResultCache.put(query, scope, results.map(item => item.id), queryEmbedding);
+    return results;
   } catch (error) {
-    console.error("Error with audio transcription:", error);
-    throw new Error(`Audio transcription not supported: ${error}`);
+    console.error("Error searching with Gemini:", error);
+    // Fallback to simple keyword matching; deliberately not cached, so the
+    // model path is retried once it recovers
+    const lowerQuery = query.toLowerCase();
+    return items.filter(item => 
+      item.title?.toLowerCase().includes(lowerQuery) ||
+      item.summary?.toLowerCase().includes(lowerQuery) ||
+      item.content?.toLowerCase().includes(lowerQuery)
+    ).slice(0, 10);
   }
 }
 
-export async function searchKnowledgeBase(query: string, items: any[]): Promise<any[]> {
-  try {
-    const systemPrompt = `You are an AI assistant that searches through a knowledge base. Given a search query and a list of knowledge items, identify the most relevant items that match the query.
+// The search instruction is constant, so it lives at module scope and is sent
+// byte-identical on every call. The query travels in the variable contents
+// instead - a stable instruction prefix is what lets provider-side prompt
+// caching hit on repeat calls.
+const SEARCH_SYSTEM_PROMPT = `You are an AI assistant that searches through a knowledge base. Given a search query and a list of knowledge items, identify the most relevant items that match the query.
 
 Analyze each item's title, summary, content, tags, and type to determine relevance.
 Return the IDs of the most relevant items in order of relevance.
 
-Query: "${query}"
-
 Respond with JSON in this format:
 {
   "relevantIds": ["id1", "id2", "id3"]
 }`;
 
-    const itemsText = items.map(item => 
-      `ID: ${item.id}\nTitle: ${item.title}\nSummary: ${item.summary || ''}\nType: ${item.type}\nTags: ${item.knowledgeItemTags?.map((kt: any) => kt.tag.name).join(', ') || ''}\n---`
-    ).join('\n');
+async function searchKnowledgeBaseUncoalesced(query: string, items: any[]): Promise<any[]> {
+  const itemsText = items.map(item => 
+    `ID: ${item.id}\nTitle: ${item.title}\nSummary: ${item.summary || ''}\nType: ${item.type}\nTags: ${item.knowledgeItemTags?.map((kt: any) => kt.tag.name).join(', ') || ''}\n---`
+  ).join('\n');
 
-    const response = await ai.models.generateContent({
-      model: "gemini-2.5-flash",
-      config: {
-        systemInstruction: systemPrompt,
-        responseMimeType: "application/json",
-        responseSchema: {
-          type: "object",
-          properties: {
-            relevantIds: {
-              type: "array",
-              items: { type: "string" }
-            }
-          },
-          required: ["relevantIds"],
+  const response = await generateContent({
+    model: "gemini-2.5-flash",
+    config: {
+      systemInstruction: SEARCH_SYSTEM_PROMPT,
+      responseMimeType: "application/json",
+      responseSchema: {
+        type: "object",
+        properties: {
+          relevantIds: {
+            type: "array",
+            items: { type: "string" }
+          }
         },
+        required: ["relevantIds"],
       },
-      contents: `Search through these items:\n\n${itemsText}`,
-    });
+    },
+    contents: `Query: "${query}"\n\nSearch through these items:\n\n${itemsText}`,
+  });
 
-    const result = JSON.parse(response.text || "{}");
-    const relevantIds = result.relevantIds || [];
-    
-    // Return items in order of relevance
-    return relevantIds.map((id: string) => items.find(item => item.id === id)).filter(Boolean);
-  } catch (error) {
-    console.error("Error searching with Gemini:", error);
-    // Fallback to simple keyword matching
-    const lowerQuery = query.toLowerCase();
-    return items.filter(item => 
-      item.title?.toLowerCase().includes(lowerQuery) ||
-      item.summary?.toLowerCase().includes(lowerQuery) ||
-      item.content?.toLowerCase().includes(lowerQuery)
-    ).slice(0, 10);
-  }
+  const result = parseModelJson(response.text);
+  const relevantIds = result.relevantIds || [];
+
+  // Return items in order of relevance
+  return relevantIds.map((id: string) => items.find(item => item.id === id)).filter(Boolean);
 }
 
 export async function summarizeText(text: string): Promise<string> {
   const prompt = `Please summarize the following text concisely while maintaining key points:\n\n${text}`;
 
-  const response = await ai.models.generateContent({
+  const response = await generateContent({
     model: "gemini-2.5-flash",
     contents: prompt,
   });
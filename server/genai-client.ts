@@ -0,0 +1,9 @@
+import { GoogleGenAI } from "@google/genai";
+
+// One shared Gemini client for every module that uses the default API key.
+// The SDK keeps its own HTTP connection pool, so sharing the instance means
+// content processing, embeddings, and chat all reuse warm connections instead
+// of each module paying its own TCP/TLS handshakes.
+export const genaiClient = new GoogleGenAI({
+  apiKey: process.env.GEMINI_API_KEY || "",
+});
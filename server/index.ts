@@ -1,42 +1,137 @@
 import express, { type Request, Response, NextFunction } from "express";
+import compression from "compression";
+import cluster from "cluster";
+import os from "os";
 import { registerRoutes } from "./routes";
+import { pool } from "./db";
 import { setupVite, serveStatic, log } from "./vite";
 
-const app = express();
-app.use(express.json({ limit: '50mb' }));
-app.use(express.urlencoded({ extended: false, limit: '50mb' }));
+// In production, fork one worker per core (override with WEB_CONCURRENCY) so
+// the I/O-bound request load scales across CPUs. The listen call below uses
+// reusePort, so every worker binds the same port and the kernel balances
+// connections. Development stays single-process for Vite's HMR.
+const workerCount =
+  process.env.NODE_ENV === "production"
+    ? parseInt(process.env.WEB_CONCURRENCY || String(os.cpus().length), 10)
+    : 1;
 
-app.use((req, res, next) => {
-  const start = Date.now();
-  const path = req.path;
-  let capturedJsonResponse: Record<string, any> | undefined = undefined;
+if (cluster.isPrimary && workerCount > 1) {
+  log(`starting ${workerCount} workers`);
+  for (let i = 0; i < workerCount; i++) {
+    cluster.fork();
+  }
 
-  const originalResJson = res.json;
-  res.json = function (bodyJson, ...args) {
-    capturedJsonResponse = bodyJson;
-    return originalResJson.apply(res, [bodyJson, ...args]);
+  // During a deploy the primary must stop respawning and pass the signal on
+  // to the workers; otherwise killing the primary orphans workers that keep
+  // serving on the reusePort sockets, and workers exiting cleanly get
+  // restarted by a still-live primary.
+  let shuttingDown = false;
+  const shutdownWorkers = (signal: NodeJS.Signals) => {
+    shuttingDown = true;
+    for (const worker of Object.values(cluster.workers ?? {})) {
+      worker?.process.kill(signal);
+    }
   };
+  process.once("SIGTERM", () => shutdownWorkers("SIGTERM"));
+  process.once("SIGINT", () => shutdownWorkers("SIGINT"));
 
-  res.on("finish", () => {
-    const duration = Date.now() - start;
-    if (path.startsWith("/api")) {
-      let logLine = `${req.method} ${path} ${res.statusCode} in ${duration}ms`;
-      if (capturedJsonResponse) {
-        logLine += ` :: ${JSON.stringify(capturedJsonResponse)}`;
-      }
+  // A worker that dies in its first seconds (bad config, port conflict) would
+  // otherwise fork-loop at full speed; back the respawn off instead.
+  const RAPID_EXIT_MS = 5_000;
+  const RESPAWN_BACKOFF_MS = 1_000;
+  const spawnedAt = new Map<number, number>();
+  cluster.on("fork", worker => {
+    spawnedAt.set(worker.id, Date.now());
+  });
+  cluster.on("exit", (worker, code) => {
+    const lifetime = Date.now() - (spawnedAt.get(worker.id) ?? 0);
+    spawnedAt.delete(worker.id);
+    if (shuttingDown) {
+      log(`worker ${worker.process.pid} exited (code ${code})`);
+      return;
+    }
+    if (lifetime < RAPID_EXIT_MS) {
+      log(`worker ${worker.process.pid} exited after ${lifetime}ms (code ${code}), restarting in ${RESPAWN_BACKOFF_MS}ms`);
+      setTimeout(() => {
+        if (!shuttingDown) cluster.fork();
+      }, RESPAWN_BACKOFF_MS).unref();
+      return;
+    }
+    log(`worker ${worker.process.pid} exited (code ${code}), restarting`);
+    cluster.fork();
+  });
+} else {
+  startServer();
+}
 
-      if (logLine.length > 80) {
-        logLine = logLine.slice(0, 79) + "…";
-      }
+async function startServer() {
+  const app = express();
+  // Express's default etag setting md5-hashes every response body just to
+  // compute a validator that authed, ever-changing API responses rarely use;
+  // skipping it removes a per-response pass over the serialized payload.
+  // The x-powered-by header is dead weight on every response.
+  app.set("etag", false);
+  app.disable("x-powered-by");
+  // Text-heavy JSON (knowledge items, AI summaries) compresses 3-5x; small
+  // payloads below the threshold aren't worth the CPU. Event streams are
+  // excluded: gzip holds data in its window until enough accumulates, which
+  // would batch up SSE chunks the whole point is to deliver incrementally.
+  app.use(
+    compression({
+      threshold: 1024,
+      filter: (req, res) => {
+        if (res.getHeader("Content-Type")?.toString().includes("text/event-stream")) {
+          return false;
+        }
+        return compression.filter(req, res);
+      },
+    }),
+  );
+  app.use(express.json({ limit: '50mb' }));
+  app.use(express.urlencoded({ extended: false, limit: '50mb' }));
+
+  // Response-body capture exists purely to enrich dev log lines; production
+  // skips the res.json patch so the hot path doesn't hold a reference to
+  // every payload just to print 80 characters
+  const captureBodies = app.get("env") === "development";
+
+  app.use((req, res, next) => {
+    const start = Date.now();
+    const path = req.path;
+    let capturedJsonResponse: Record<string, any> | undefined = undefined;
 
-      log(logLine);
+    if (captureBodies) {
+      const originalResJson = res.json;
+      res.json = function (bodyJson, ...args) {
+        capturedJsonResponse = bodyJson;
+        return originalResJson.apply(res, [bodyJson, ...args]);
+      };
     }
-  });
 
-  next();
-});
+    res.on("finish", () => {
+      const duration = Date.now() - start;
+      if (path.startsWith("/api")) {
+        let logLine = `${req.method} ${path} ${res.statusCode} in ${duration}ms`;
+        if (capturedJsonResponse) {
+          // The line is truncated to 80 chars below, so don't pay to re-serialize
+          // large list payloads a second time just to throw the bytes away
+          const snippet = Array.isArray(capturedJsonResponse)
+            ? `Array(${capturedJsonResponse.length})`
+            : JSON.stringify(capturedJsonResponse);
+          logLine += ` :: ${snippet}`;
+        }
+
+        if (logLine.length > 80) {
+          logLine = logLine.slice(0, 79) + "…";
+        }
+
+        log(logLine);
+      }
+    });
+
+    next();
+  });
 
-(async () => {
   const server = await registerRoutes(app);
 
   app.use((err: any, _req: Request, res: Response, _next: NextFunction) => {
@@ -61,6 +156,13 @@ app.use((req, res, next) => {
   // this serves both the API and the client.
   // It is the only port that is not firewalled.
   const port = parseInt(process.env.PORT || '5000', 10);
+
+  // Keep client connections alive longer than the default 5s so proxies and
+  // busy clients reuse sockets instead of paying a TCP handshake per request.
+  // headersTimeout must exceed keepAliveTimeout to avoid premature resets.
+  server.keepAliveTimeout = 65_000;
+  server.headersTimeout = 66_000;
+
   server.listen({
     port,
     host: "0.0.0.0",
@@ -68,4 +170,17 @@ app.use((req, res, next) => {
   }, () => {
     log(`serving on port ${port}`);
   });
-})();
+
+  // Drain on shutdown: stop accepting connections, let in-flight requests
+  // finish, then close the DB pool - so a redeploy doesn't sever active
+  // requests or strand server-side connections. The timer is a failsafe for
+  // connections that never drain (open SSE streams).
+  const shutdown = () => {
+    server.close(() => {
+      pool.end().finally(() => process.exit(0));
+    });
+    setTimeout(() => process.exit(0), 10_000).unref();
+  };
+  process.once("SIGTERM", shutdown);
+  process.once("SIGINT", shutdown);
+}
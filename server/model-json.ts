@@ -0,0 +1,12 @@
+// Model output is requested as JSON everywhere (responseSchema on Gemini,
+// json_object mode on OpenAI), but models occasionally wrap the object in a
+// markdown code fence anyway. One precompiled regex strips the fence and the
+// parse happens exactly once per response, instead of each call site growing
+// its own ad-hoc extraction.
+const CODE_FENCE = /^\s*```(?:json)?\s*([\s\S]*?)\s*```\s*$/;
+
+export function parseModelJson(raw: string | null | undefined): any {
+  if (!raw) return {};
+  const match = CODE_FENCE.exec(raw);
+  return JSON.parse(match ? match[1] : raw);
+}
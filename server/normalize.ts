@@ -0,0 +1,12 @@
+// Query/key normalization shared by the caching layers. The regexes are
+// compiled once at module load; these helpers sit on cache-lookup hot paths
+// where per-call regex construction would be measurable rework.
+
+const WHITESPACE_RUN = /\s+/g;
+
+// Canonical form for cache keys: trivial differences in case and spacing
+// ("Meeting  Notes " vs "meeting notes") should hit the same entry, while
+// any real wording change still produces a distinct key.
+export function normalizeForKey(text: string): string {
+  return text.trim().toLowerCase().replace(WHITESPACE_RUN, " ");
+}
@@ -1,31 +1,43 @@
+import { createReadStream } from "fs";
 import OpenAI from "openai";
+import type { ProcessedContent } from "./gemini";
+import { parseModelJson } from "./model-json";
+
+export type { ProcessedContent };
 
 // the newest OpenAI model is "gpt-4o" which was released May 13, 2024. do not change this unless explicitly requested by the user
-const openai = new OpenAI({ apiKey: process.env.OPENAI_API_KEY });
-
-export interface ProcessedContent {
-  title: string;
-  summary: string;
-  tags: string[];
-  category: string;
-  thumbnailUrl?: string;
-  metadata?: {
-    videoId?: string;
-    duration?: string;
-    platform?: string;
-    dimensions?: { width: number; height: number };
-    [key: string]: any;
-  };
+// Constructed on first use rather than at import time, so merely importing
+// this module (Gemini is the default processing path) costs nothing
+let openaiClient: OpenAI | null = null;
+
+export function getOpenAIClient(): OpenAI {
+  if (!openaiClient) {
+    openaiClient = new OpenAI({ apiKey: process.env.OPENAI_API_KEY });
+  }
+  return openaiClient;
 }
 
+// System prompts are constant per function, so they are defined once at
+// module load instead of being rebuilt inside every request - and a stable
+// system message is a prefix OpenAI's prompt cache can reuse across calls.
+const TEXT_SYSTEM_PROMPT = "You are an AI assistant that processes text content for a personal knowledge management system. Analyze the provided text and extract a concise title, summary, relevant tags, and category. Respond with JSON in this format: { 'title': string, 'summary': string, 'tags': string[], 'category': string }";
+
+const IMAGE_SYSTEM_PROMPT = "You are an AI assistant that analyzes images for a personal knowledge management system. Provide detailed, specific analysis including what's in the image, the context, style, colors, people, objects, text, activities, and any other relevant details. Create descriptive, searchable tags and categorize appropriately. IMPORTANT: Generate a descriptive, meaningful title that describes what's actually in the image - not just 'image' or 'photo'. Make the title specific and informative. Respond with JSON in this format: { 'title': string, 'summary': string, 'tags': string[], 'category': string, 'suggestedFileName': string }";
+
+const DOCUMENT_SYSTEM_PROMPT = "You are an AI assistant that processes document content for a personal knowledge management system. Analyze the provided document text and extract a meaningful title, comprehensive summary, relevant tags, and category. Respond with JSON in this format: { 'title': string, 'summary': string, 'tags': string[], 'category': string }";
+
+const WEB_CONTENT_SYSTEM_PROMPT = "You are an AI assistant that analyzes web content for a personal knowledge management system. Provide detailed analysis and generate meaningful, specific tags based on the actual content, topic, technology, context, and purpose. Focus on creating useful, searchable tags. Respond with JSON in this format: { 'title': string, 'summary': string, 'tags': string[], 'category': string }";
+
+const SEARCH_SYSTEM_PROMPT = "You are a search assistant for a personal knowledge management system. Given a user query and a list of knowledge items, return the IDs of the most relevant items in order of relevance. Consider semantic similarity, not just keyword matching. Respond with JSON in this format: { 'relevantIds': string[] }";
+
 export async function processTextContent(content: string): Promise<ProcessedContent> {
   try {
-    const response = await openai.chat.completions.create({
+    const response = await getOpenAIClient().chat.completions.create({
       model: "gpt-4o",
       messages: [
         {
           role: "system",
-          content: "You are an AI assistant that processes text content for a personal knowledge management system. Analyze the provided text and extract a concise title, summary, relevant tags, and category. Respond with JSON in this format: { 'title': string, 'summary': string, 'tags': string[], 'category': string }"
+          content: TEXT_SYSTEM_PROMPT
         },
         {
           role: "user",
@@ -35,7 +47,7 @@ export async function processTextContent(content: string): Promise<ProcessedCont
       response_format: { type: "json_object" },
     });
 
-    const result = JSON.parse(response.choices[0].message.content || "{}");
+    const result = parseModelJson(response.choices[0].message.content);
     
     return {
       title: result.title || "Untitled Content",
@@ -51,12 +63,12 @@ export async function processTextContent(content: string): Promise<ProcessedCont
 
 export async function processImageContent(base64Image: string, fileName?: string): Promise<ProcessedContent> {
   try {
-    const response = await openai.chat.completions.create({
+    const response = await getOpenAIClient().chat.completions.create({
       model: "gpt-4o",
       messages: [
         {
           role: "system",
-          content: "You are an AI assistant that analyzes images for a personal knowledge management system. Provide detailed, specific analysis including what's in the image, the context, style, colors, people, objects, text, activities, and any other relevant details. Create descriptive, searchable tags and categorize appropriately. IMPORTANT: Generate a descriptive, meaningful title that describes what's actually in the image - not just 'image' or 'photo'. Make the title specific and informative. Respond with JSON in this format: { 'title': string, 'summary': string, 'tags': string[], 'category': string, 'suggestedFileName': string }"
+          content: IMAGE_SYSTEM_PROMPT
         },
         {
           role: "user",
@@ -92,7 +104,7 @@ For suggestedFileName: Create a clean, descriptive filename without spaces (use
       max_tokens: 1000,
     });
 
-    const result = JSON.parse(response.choices[0].message.content || "{}");
+    const result = parseModelJson(response.choices[0].message.content);
     
     return {
       title: result.title || fileName || "Image Content",
@@ -113,10 +125,9 @@ For suggestedFileName: Create a clean, descriptive filename without spaces (use
 
 export async function transcribeAudio(audioFilePath: string): Promise<{ text: string, duration?: number }> {
   try {
-    const fs = await import("fs");
-    const audioReadStream = fs.createReadStream(audioFilePath);
+    const audioReadStream = createReadStream(audioFilePath);
 
-    const transcription = await openai.audio.transcriptions.create({
+    const transcription = await getOpenAIClient().audio.transcriptions.create({
       file: audioReadStream,
       model: "whisper-1",
     });
@@ -133,12 +144,12 @@ export async function transcribeAudio(audioFilePath: string): Promise<{ text: st
 
 export async function processDocumentContent(content: string, fileName?: string): Promise<ProcessedContent> {
   try {
-    const response = await openai.chat.completions.create({
+    const response = await getOpenAIClient().chat.completions.create({
       model: "gpt-4o",
       messages: [
         {
           role: "system",
-          content: "You are an AI assistant that processes document content for a personal knowledge management system. Analyze the provided document text and extract a meaningful title, comprehensive summary, relevant tags, and category. Respond with JSON in this format: { 'title': string, 'summary': string, 'tags': string[], 'category': string }"
+          content: DOCUMENT_SYSTEM_PROMPT
         },
         {
           role: "user",
@@ -148,7 +159,7 @@ export async function processDocumentContent(content: string, fileName?: string)
       response_format: { type: "json_object" },
     });
 
-    const result = JSON.parse(response.choices[0].message.content || "{}");
+    const result = parseModelJson(response.choices[0].message.content);
     
     return {
       title: result.title || fileName || "Document",
@@ -204,7 +215,7 @@ export async function processVideoLink(url: string): Promise<ProcessedContent> {
         const channel = channelMatch ? channelMatch[1] : '';
         
         // Generate AI summary using DeepSeek Chat for better summarization
-        const aiResponse = await openai.chat.completions.create({
+        const aiResponse = await getOpenAIClient().chat.completions.create({
           model: "deepseek-chat",
           messages: [
             {
@@ -222,18 +233,18 @@ Please provide:
 2. 5-8 relevant, specific tags based on the actual content (include 'video', 'youtube')
 3. An appropriate category name
 
-Format as JSON: { "summary": "...", "tags": [...], "category": "..." }`
+Respond with JSON in this format: { "summary": "...", "tags": [...], "category": "..." }`
             }
           ],
+          // Enforced JSON output makes the reply directly parseable; no need
+          // to fish the object out of surrounding prose with a regex
+          response_format: { type: "json_object" },
           max_tokens: 400
         });
 
         let aiResult: any = {};
         try {
-          const content = aiResponse.choices[0].message.content || '{}';
-          // Try to extract JSON from the content
-          const jsonMatch = content.match(/\{[\s\S]*\}/);
-          aiResult = JSON.parse(jsonMatch ? jsonMatch[0] : '{}');
+          aiResult = parseModelJson(aiResponse.choices[0].message.content);
         } catch (error) {
           console.log('Error parsing YouTube AI response, using fallback');
           aiResult = {};
@@ -286,7 +297,7 @@ Format as JSON: { "summary": "...", "tags": [...], "category": "..." }`
         const description = descMatch ? descMatch[1] : '';
         
         // Generate AI summary using DeepSeek Chat
-        const aiResponse = await openai.chat.completions.create({
+        const aiResponse = await getOpenAIClient().chat.completions.create({
           model: "deepseek-chat",
           messages: [
             {
@@ -303,18 +314,16 @@ Please provide:
 2. 5-8 relevant, specific tags (include 'video', 'vimeo')
 3. An appropriate category name
 
-Format as JSON: { "summary": "...", "tags": [...], "category": "..." }`
+Respond with JSON in this format: { "summary": "...", "tags": [...], "category": "..." }`
             }
           ],
+          response_format: { type: "json_object" },
           max_tokens: 300
         });
 
         let aiResult: any = {};
         try {
-          const content = aiResponse.choices[0].message.content || '{}';
-          // Try to extract JSON from the content
-          const jsonMatch = content.match(/\{[\s\S]*\}/);
-          aiResult = JSON.parse(jsonMatch ? jsonMatch[0] : '{}');
+          aiResult = parseModelJson(aiResponse.choices[0].message.content);
         } catch (error) {
           console.log('Error parsing Vimeo AI response, using fallback');
           aiResult = {};
@@ -399,12 +408,12 @@ export async function processLinkContent(url: string): Promise<ProcessedContent>
     const ogImageMatch = html.match(/<meta[^>]*property=["']og:image["'][^>]*content=["']([^"']*)["']/i);
     const thumbnailUrl = ogImageMatch ? ogImageMatch[1] : undefined;
     
-    const aiResponse = await openai.chat.completions.create({
+    const aiResponse = await getOpenAIClient().chat.completions.create({
       model: "gpt-4o",
       messages: [
         {
           role: "system",
-          content: "You are an AI assistant that analyzes web content for a personal knowledge management system. Provide detailed analysis and generate meaningful, specific tags based on the actual content, topic, technology, context, and purpose. Focus on creating useful, searchable tags. Respond with JSON in this format: { 'title': string, 'summary': string, 'tags': string[], 'category': string }"
+          content: WEB_CONTENT_SYSTEM_PROMPT
         },
         {
           role: "user",
@@ -422,7 +431,7 @@ ${textContent.substring(0, 4000)}`
       response_format: { type: "json_object" },
     });
 
-    const result = JSON.parse(aiResponse.choices[0].message.content || "{}");
+    const result = parseModelJson(aiResponse.choices[0].message.content);
     
     return {
       title: result.title || htmlTitle || `Content from ${domain}`,
@@ -491,12 +500,12 @@ export async function searchKnowledgeBase(query: string, knowledgeItems: any[]):
       `ID: ${item.id}\nTitle: ${item.title}\nSummary: ${item.summary}\nContent: ${item.content || ""}\nTags: ${item.knowledgeItemTags?.map((kt: any) => kt.tag.name).join(", ") || ""}`
     ).join("\n\n---\n\n");
 
-    const response = await openai.chat.completions.create({
+    const response = await getOpenAIClient().chat.completions.create({
       model: "gpt-4o",
       messages: [
         {
           role: "system",
-          content: "You are a search assistant for a personal knowledge management system. Given a user query and a list of knowledge items, return the IDs of the most relevant items in order of relevance. Consider semantic similarity, not just keyword matching. Respond with JSON in this format: { 'relevantIds': string[] }"
+          content: SEARCH_SYSTEM_PROMPT
         },
         {
           role: "user",
@@ -506,7 +515,7 @@ export async function searchKnowledgeBase(query: string, knowledgeItems: any[]):
       response_format: { type: "json_object" },
     });
 
-    const result = JSON.parse(response.choices[0].message.content || "{}");
+    const result = parseModelJson(response.choices[0].message.content);
     const relevantIds = Array.isArray(result.relevantIds) ? result.relevantIds : [];
     
     // Return items in order of relevance
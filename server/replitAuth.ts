@@ -8,10 +8,6 @@ import memoize from "memoizee";
 import connectPg from "connect-pg-simple";
 import { storage } from "./storage";
 
-if (!process.env.REPLIT_DOMAINS) {
-  throw new Error("Environment variable REPLIT_DOMAINS not provided");
-}
-
 const getOidcConfig = memoize(
   async () => {
     return await client.discovery(
@@ -30,6 +26,10 @@ export function getSession() {
     createTableIfMissing: false,
     ttl: sessionTtl,
     tableName: "sessions",
+    // Default prune runs a DELETE over the sessions table every 60s from the
+    // serving process; with a 1-week TTL, pruning every 15 minutes is plenty
+    // and keeps the periodic scan off the request path
+    pruneSessionInterval: 60 * 15,
   });
   return session({
     secret: process.env.SESSION_SECRET!,
@@ -67,6 +67,12 @@ async function upsertUser(
 }
 
 export async function setupAuth(app: Express) {
+  // Validated here rather than at import time, so merely loading this module
+  // (tooling, scripts, future tests) doesn't require a configured environment
+  if (!process.env.REPLIT_DOMAINS) {
+    throw new Error("Environment variable REPLIT_DOMAINS not provided");
+  }
+
   app.set("trust proxy", 1);
   app.use(getSession());
   app.use(passport.initialize());
@@ -0,0 +1,295 @@
+import memoize from "memoizee";
+import { BoundedCache } from "./bounded-cache";
+import { genaiClient } from "./genai-client";
+
+// Embedding-keyed semantic cache for AI responses.
+// Near-duplicate prompts (cosine similarity >= threshold) skip the LLM round-trip
+// entirely and return the stored value, which turns repeat questions from a
+// multi-second model call into a sub-millisecond lookup.
+
+const EMBEDDING_MODEL = "text-embedding-004";
+const DEFAULT_SIMILARITY_THRESHOLD = 0.92;
+const DEFAULT_TTL_MS = 5 * 60 * 1000; // 5 minutes
+const MAX_ENTRIES_PER_SCOPE = 256;
+// Scopes are keyed by item-set hashes and chat contexts, so new ones keep
+// appearing for the life of the process; the LRU bound keeps the total
+// footprint flat instead of growing with every distinct context ever seen
+const MAX_SCOPES = 64;
+
+const ai = genaiClient;
+
+// Exact-repeat prompts (retries, identical searches, probe traffic) are common,
+// so memoize embeddings by the exact input string and skip the embedding API
+// entirely on repeats. Failed calls are not cached so transient errors retry.
+const embedText = memoize(embedTextUncached, {
+  promise: true,
+  primitive: true,
+  max: 4096,
+});
+
+// Concurrent embedding requests are coalesced into one batched API call: each
+// caller parks on the queue and a short timer flushes everything that arrived
+// within the window. Under load this turns N round-trips into one. A full
+// batch flushes immediately - once there's enough to fill a request, waiting
+// out the rest of the window only adds latency without improving batching.
+const BATCH_WINDOW_MS = 10;
+const MAX_BATCH_SIZE = 32;
+
+interface PendingEmbed {
+  text: string;
+  resolve: (embedding: Float32Array) => void;
+  reject: (error: unknown) => void;
+}
+
+const pendingEmbeds: PendingEmbed[] = [];
+let flushTimer: NodeJS.Timeout | null = null;
+
+function embedTextUncached(text: string): Promise<Float32Array> {
+  return new Promise((resolve, reject) => {
+    pendingEmbeds.push({ text, resolve, reject });
+    if (pendingEmbeds.length >= MAX_BATCH_SIZE) {
+      if (flushTimer) {
+        clearTimeout(flushTimer);
+        flushTimer = null;
+      }
+      void flushEmbedQueue();
+    } else if (!flushTimer) {
+      flushTimer = setTimeout(flushEmbedQueue, BATCH_WINDOW_MS);
+    }
+  });
+}
+
+async function flushEmbedQueue(): Promise<void> {
+  flushTimer = null;
+  const batch = pendingEmbeds.splice(0, pendingEmbeds.length);
+  if (batch.length === 0) return;
+
+  try {
+    const response = await ai.models.embedContent({
+      model: EMBEDDING_MODEL,
+      contents: batch.map(item => item.text),
+    });
+
+    const embeddings = response.embeddings ?? [];
+    batch.forEach((item, i) => {
+      const values = embeddings[i]?.values;
+      if (values && values.length > 0) {
+        item.resolve(normalizeEmbedding(values));
+      } else {
+        item.reject(new Error("Empty embedding response"));
+      }
+    });
+  } catch (error) {
+    for (const item of batch) {
+      item.reject(error);
+    }
+  }
+}
+
+// Fire-and-forget warm-up: handlers call this as soon as they know the
+// prompt, so the embedding round-trip overlaps with storage reads and
+// validation instead of sitting on the cache lookup's critical path. The
+// memoized embedText makes the later lookup a same-promise join.
+export function warmEmbedding(text: string): void {
+  embedText(text).catch(() => {});
+}
+
+// L2-normalize so cosine similarity reduces to a dot product
+function normalizeEmbedding(values: number[]): Float32Array {
+  const embedding = new Float32Array(values);
+  let norm = 0;
+  for (let i = 0; i < embedding.length; i++) {
+    norm += embedding[i] * embedding[i];
+  }
+  norm = Math.sqrt(norm) || 1;
+  for (let i = 0; i < embedding.length; i++) {
+    embedding[i] /= norm;
+  }
+  return embedding;
+}
+
+// Each scope keeps its embeddings packed row-major in one contiguous matrix
+// (grown by doubling) rather than one small array per entry, so a lookup is a
+// single linear scan over dense memory instead of a pointer chase. Rows are
+// quantized to int8 with a per-row scale: the scan is memory-bandwidth-bound,
+// so 1 byte per element instead of 4 means 4x less memory traffic and 4x more
+// entries per RAM budget. Only the stored rows are quantized - the query stays
+// float32, which bounds the similarity error to the one quantized operand
+// (well under the matching threshold's resolution).
+interface CacheScope<T> {
+  matrix: Int8Array;
+  scales: number[];
+  dim: number;
+  count: number;
+  values: T[];
+  createdAts: number[];
+}
+
+// Quantize a normalized embedding into the row at `base`, returning the scale
+// that maps int8 values back to floats
+function quantizeRow(matrix: Int8Array, base: number, embedding: Float32Array): number {
+  let maxAbs = 0;
+  for (let i = 0; i < embedding.length; i++) {
+    const abs = Math.abs(embedding[i]);
+    if (abs > maxAbs) maxAbs = abs;
+  }
+  const scale = (maxAbs || 1) / 127;
+  for (let i = 0; i < embedding.length; i++) {
+    matrix[base + i] = Math.round(embedding[i] / scale);
+  }
+  return scale;
+}
+
+// Fused similarity kernel: one pass over the packed matrix computes every
+// dot product and tracks the argmax, with no per-row allocation. The inner
+// loop is unrolled 4-wide, which lets V8 keep the accumulators in registers -
+// the scan is memory-bandwidth-bound, so the fewer passes the better.
+function top1Dot(
+  entries: CacheScope<unknown>,
+  query: Float32Array,
+  minCreatedAt: number,
+): { index: number; score: number } {
+  const { matrix, scales, dim, count, createdAts } = entries;
+  const tail = dim & ~3;
+  let bestScore = -1;
+  let bestIndex = -1;
+
+  for (let row = 0; row < count; row++) {
+    if (createdAts[row] < minCreatedAt) continue;
+    const base = row * dim;
+    let s0 = 0, s1 = 0, s2 = 0, s3 = 0;
+    let i = 0;
+    for (; i < tail; i += 4) {
+      s0 += matrix[base + i] * query[i];
+      s1 += matrix[base + i + 1] * query[i + 1];
+      s2 += matrix[base + i + 2] * query[i + 2];
+      s3 += matrix[base + i + 3] * query[i + 3];
+    }
+    let score = s0 + s1 + s2 + s3;
+    for (; i < dim; i++) {
+      score += matrix[base + i] * query[i];
+    }
+    // Undo the row's quantization scale to get back to cosine similarity
+    score *= scales[row];
+    if (score > bestScore) {
+      bestScore = score;
+      bestIndex = row;
+    }
+  }
+
+  return { index: bestIndex, score: bestScore };
+}
+
+export class SemanticCache<T = unknown> {
+  private scopes = new BoundedCache<string, CacheScope<T>>(MAX_SCOPES);
+  private ttlMs: number;
+  private threshold: number;
+
+  constructor(options: { ttlMs?: number; threshold?: number } = {}) {
+    this.ttlMs = options.ttlMs ?? DEFAULT_TTL_MS;
+    this.threshold = options.threshold ?? DEFAULT_SIMILARITY_THRESHOLD;
+  }
+
+  // Returns the cached value for the closest stored prompt in this scope
+  // (undefined on a miss) together with the query embedding, so the caller
+  // can hand the embedding straight back to put() after computing the value
+  // instead of embedding the same text a second time. Never throws: embedding
+  // failures degrade to a miss so the cache can never break the request path.
+  async lookup(
+    text: string,
+    scope: string,
+  ): Promise<{ value?: T; embedding?: Float32Array }> {
+    let embedding: Float32Array;
+    try {
+      embedding = await embedText(text);
+    } catch (error) {
+      console.error("Semantic cache lookup failed:", error);
+      return {};
+    }
+
+    const entries = this.scopes.get(scope);
+    if (!entries || entries.count === 0) return { embedding };
+
+    const minCreatedAt = Date.now() - this.ttlMs;
+    const best = top1Dot(entries, embedding, minCreatedAt);
+
+    if (best.index >= 0 && best.score >= this.threshold) {
+      return { value: entries.values[best.index], embedding };
+    }
+    return { embedding };
+  }
+
+  async put(
+    text: string,
+    scope: string,
+    value: T,
+    precomputed?: Float32Array,
+  ): Promise<void> {
+    try {
+      const embedding = precomputed ?? (await embedText(text));
+      let entries = this.scopes.get(scope);
+      if (!entries) {
+        entries = {
+          matrix: new Int8Array(embedding.length * 8),
+          scales: [],
+          dim: embedding.length,
+          count: 0,
+          values: [],
+          createdAts: [],
+        };
+        this.scopes.set(scope, entries);
+      }
+
+      if (entries.count >= MAX_ENTRIES_PER_SCOPE) {
+        this.compact(entries);
+      }
+
+      // Grow the backing matrix by doubling when full
+      if ((entries.count + 1) * entries.dim > entries.matrix.length) {
+        const grown = new Int8Array(entries.matrix.length * 2);
+        grown.set(entries.matrix);
+        entries.matrix = grown;
+      }
+
+      entries.scales.push(quantizeRow(entries.matrix, entries.count * entries.dim, embedding));
+      entries.values.push(value);
+      entries.createdAts.push(Date.now());
+      entries.count++;
+    } catch (error) {
+      console.error("Semantic cache store failed:", error);
+    }
+  }
+
+  // Drop expired rows, then the oldest half if still at capacity, rewriting
+  // the survivors to the front of the matrix
+  private compact(entries: CacheScope<T>): void {
+    const now = Date.now();
+    let keepFrom = 0;
+    const survivors: number[] = [];
+    for (let row = 0; row < entries.count; row++) {
+      if (now - entries.createdAts[row] <= this.ttlMs) {
+        survivors.push(row);
+      }
+    }
+    if (survivors.length >= MAX_ENTRIES_PER_SCOPE) {
+      keepFrom = survivors.length - (MAX_ENTRIES_PER_SCOPE >> 1);
+    }
+
+    const kept = survivors.slice(keepFrom);
+    const { dim } = entries;
+    const values: T[] = [];
+    const createdAts: number[] = [];
+    const scales: number[] = [];
+    kept.forEach((row, target) => {
+      entries.matrix.copyWithin(target * dim, row * dim, (row + 1) * dim);
+      values.push(entries.values[row]);
+      createdAts.push(entries.createdAts[row]);
+      scales.push(entries.scales[row]);
+    });
+
+    entries.values = values;
+    entries.createdAts = createdAts;
+    entries.scales = scales;
+    entries.count = kept.length;
+  }
+}
@@ -24,7 +24,8 @@ import {
   type ConversationWithMessages,
 } from "@shared/schema";
 import { db } from "./db";
-import { eq, desc, and, or, ilike, inArray, isNotNull } from "drizzle-orm";
+import { BoundedCache } from "./bounded-cache";
+import { eq, desc, and, or, ilike, inArray, isNotNull, sql } from "drizzle-orm";
 
 // Interface for storage operations
 export interface IStorage {
@@ -35,11 +36,14 @@ export interface IStorage {
   
   // Knowledge item operations
   createKnowledgeItem(item: InsertKnowledgeItem): Promise<KnowledgeItem>;
+  createKnowledgeItemWithTags(item: InsertKnowledgeItem, tagNames: string[]): Promise<KnowledgeItemWithTags>;
   getKnowledgeItem(id: string): Promise<KnowledgeItemWithTags | undefined>;
   getKnowledgeItemsByUser(userId: string, limit?: number, offset?: number): Promise<KnowledgeItemWithTags[]>;
+  getKnowledgeItemsByUserAfter(userId: string, limit: number, cursor?: { createdAt: Date; id: string }): Promise<KnowledgeItemWithTags[]>;
   updateKnowledgeItem(id: string, updates: Partial<InsertKnowledgeItem>): Promise<KnowledgeItem | undefined>;
   deleteKnowledgeItem(id: string): Promise<boolean>;
   searchKnowledgeItems(userId: string, query: string): Promise<KnowledgeItemWithTags[]>;
+  getKnowledgeItemsVersion(userId: string): Promise<string>;
   
   // Tag operations
   createTag(tag: InsertTag): Promise<Tag>;
@@ -58,7 +62,9 @@ export interface IStorage {
   // Chat conversation operations
   createConversation(conversation: InsertConversation): Promise<Conversation>;
   getConversation(id: string): Promise<ConversationWithMessages | undefined>;
-  getConversationsByUser(userId: string): Promise<Conversation[]>;
+  getConversationMeta(id: string): Promise<Conversation | undefined>;
+  getConversationsByUser(userId: string): Promise<(Conversation & { messageCount: number })[]>;
+  getConversationsVersion(userId: string): Promise<string>;
   deleteConversation(id: string): Promise<boolean>;
   
   // Chat message operations
@@ -67,9 +73,71 @@ export interface IStorage {
 }
 
 export class DatabaseStorage implements IStorage {
+  // User rows change only on login upsert, but every authenticated page load
+  // re-reads one; a short TTL absorbs that per-request query while keeping
+  // staleness bounded to seconds. Upserts write through so a fresh login is
+  // visible immediately.
+  private userCache = new BoundedCache<string, User>(1000, 30_000);
+
+  // Tag sets are small, change rarely, and get re-read on every create and
+  // upload for the similarity matching; a short TTL takes that repeated
+  // full-list query off the hot path. Creation paths update the entry, and
+  // the unique (user_id, name) index plus the conflict fallback below keep a
+  // stale list from ever producing duplicate tags.
+  private userTagsCache = new BoundedCache<string, Tag[]>(1000, 60_000);
+
+  private async getUserTags(userId: string): Promise<Tag[]> {
+    const cached = this.userTagsCache.get(userId);
+    if (cached) return cached;
+
+    const userTags = await db
+      .select()
+      .from(tags)
+      .where(eq(tags.userId, userId));
+    this.userTagsCache.set(userId, userTags);
+    return userTags;
+  }
+
+  // Insert missing tags tolerating concurrent creators: rows lost to the
+  // unique index are re-read so the caller always gets every tag it asked for
+  private async insertMissingTags(
+    executor: typeof db | Parameters<Parameters<typeof db.transaction>[0]>[0],
+    userId: string,
+    names: string[],
+  ): Promise<Tag[]> {
+    const inserted = await executor
+      .insert(tags)
+      .values(
+        names.map(name => ({
+          name,
+          userId,
+          color: getRandomTagColor(),
+        })),
+      )
+      .onConflictDoNothing()
+      .returning();
+
+    if (inserted.length === names.length) return inserted;
+
+    const lostNames = names.filter(
+      name => !inserted.some(tag => tag.name === name),
+    );
+    const existing = await executor
+      .select()
+      .from(tags)
+      .where(and(eq(tags.userId, userId), inArray(tags.name, lostNames)));
+    return [...inserted, ...existing];
+  }
+
   // User operations
   async getUser(id: string): Promise<User | undefined> {
+    const cached = this.userCache.get(id);
+    if (cached) return cached;
+
     const [user] = await db.select().from(users).where(eq(users.id, id));
+    if (user) {
+      this.userCache.set(id, user);
+    }
     return user;
   }
 
@@ -81,10 +149,11 @@ export class DatabaseStorage implements IStorage {
         target: users.id,
         set: {
           ...userData,
-          updatedAt: new Date(),
+          updatedAt: sql`now()`,
         },
       })
       .returning();
+    this.userCache.set(user.id, user);
     return user;
   }
 
@@ -97,29 +166,83 @@ export class DatabaseStorage implements IStorage {
     return knowledgeItem;
   }
 
-  async getKnowledgeItem(id: string): Promise<KnowledgeItemWithTags | undefined> {
-    const [item] = await db
-      .select()
-      .from(knowledgeItems)
-      .leftJoin(knowledgeItemTags, eq(knowledgeItems.id, knowledgeItemTags.knowledgeItemId))
-      .leftJoin(tags, eq(knowledgeItemTags.tagId, tags.id))
-      .where(eq(knowledgeItems.id, id));
+  // Item, tags, and join rows land in one transaction: a single commit (one
+  // fsync, one lock window) instead of one per statement, and a failure
+  // can't leave an item behind with half its tags attached
+  async createKnowledgeItemWithTags(
+    item: InsertKnowledgeItem,
+    tagNames: string[],
+  ): Promise<KnowledgeItemWithTags> {
+    return await db.transaction(async (tx) => {
+      const [created] = await tx
+        .insert(knowledgeItems)
+        .values(item)
+        .returning();
 
-    if (!item.knowledge_items) return undefined;
+      if (tagNames.length === 0) {
+        return { ...created, knowledgeItemTags: [] };
+      }
 
-    // Get all tags for this item
-    const itemTags = await db
-      .select({
-        knowledgeItemId: knowledgeItemTags.knowledgeItemId,
-        tagId: knowledgeItemTags.tagId,
-        tag: tags,
-      })
-      .from(knowledgeItemTags)
-      .innerJoin(tags, eq(knowledgeItemTags.tagId, tags.id))
-      .where(eq(knowledgeItemTags.knowledgeItemId, id));
+      const allExistingTags = await this.getUserTags(item.userId);
+      const { matched, toCreate } = this.matchTags(tagNames, allExistingTags);
+
+      const resultTags = [...matched];
+      if (toCreate.length > 0) {
+        const newTags = await this.insertMissingTags(tx, item.userId, toCreate);
+        resultTags.push(...newTags);
+        // Refresh after the new rows exist; if the transaction rolls back
+        // the entry just expires early
+        this.userTagsCache.delete(item.userId);
+      }
+
+      if (resultTags.length > 0) {
+        await tx
+          .insert(knowledgeItemTags)
+          .values(
+            resultTags.map(tag => ({
+              knowledgeItemId: created.id,
+              tagId: tag.id,
+            })),
+          )
+          .onConflictDoNothing();
+      }
+
+      return {
+        ...created,
+        knowledgeItemTags: resultTags.map(tag => ({
+          knowledgeItemId: created.id,
+          tagId: tag.id,
+          tag,
+        })),
+      };
+    });
+  }
+
+  async getKnowledgeItem(id: string): Promise<KnowledgeItemWithTags | undefined> {
+    // The item row and its tag rows are independent, so fetch them in
+    // parallel. The previous version also joined tags onto the item query
+    // and then threw that data away before re-fetching it sequentially.
+    const [[item], itemTags] = await Promise.all([
+      db
+        .select()
+        .from(knowledgeItems)
+        .where(eq(knowledgeItems.id, id))
+        .limit(1),
+      db
+        .select({
+          knowledgeItemId: knowledgeItemTags.knowledgeItemId,
+          tagId: knowledgeItemTags.tagId,
+          tag: tags,
+        })
+        .from(knowledgeItemTags)
+        .innerJoin(tags, eq(knowledgeItemTags.tagId, tags.id))
+        .where(eq(knowledgeItemTags.knowledgeItemId, id)),
+    ]);
+
+    if (!item) return undefined;
 
     return {
-      ...item.knowledge_items,
+      ...item,
       knowledgeItemTags: itemTags.map(t => ({
         knowledgeItemId: t.knowledgeItemId,
         tagId: t.tagId,
@@ -137,8 +260,51 @@ export class DatabaseStorage implements IStorage {
       .limit(limit)
       .offset(offset);
 
-    // Get tags for all items
+    return await this.attachTags(items);
+  }
+
+  // Keyset (seek) variant: pages are anchored on the (createdAt, id) of the
+  // previous page's last row instead of an OFFSET, so page N costs the same
+  // index seek as page 1 rather than scanning and discarding N*limit rows
+  async getKnowledgeItemsByUserAfter(
+    userId: string,
+    limit: number,
+    cursor?: { createdAt: Date; id: string },
+  ): Promise<KnowledgeItemWithTags[]> {
+    const conditions = [eq(knowledgeItems.userId, userId)];
+    if (cursor) {
+      // The cursor timestamp is a JS Date and so carries only millisecond
+      // precision, while created_at keeps microseconds. Truncate the column
+      // to the same precision for the comparison, otherwise rows sharing the
+      // boundary row's millisecond but with smaller microseconds fall between
+      // pages and are never returned.
+      conditions.push(
+        sql`(date_trunc('milliseconds', ${knowledgeItems.createdAt}), ${knowledgeItems.id}) < (${cursor.createdAt}, ${cursor.id})`,
+      );
+    }
+
+    // The sort key must match the cursor key exactly - ordering on the raw
+    // microsecond timestamp while paginating on the truncated one would let
+    // same-millisecond rows straddle a page boundary in either direction
+    // (repeats or drops) whenever id order disagrees with microsecond order.
+    const items = await db
+      .select()
+      .from(knowledgeItems)
+      .where(and(...conditions))
+      .orderBy(
+        sql`date_trunc('milliseconds', ${knowledgeItems.createdAt}) desc`,
+        desc(knowledgeItems.id),
+      )
+      .limit(limit);
+
+    return await this.attachTags(items);
+  }
+
+  // Batch-load tags for a page of items with one query, preserving item order
+  private async attachTags(items: KnowledgeItem[]): Promise<KnowledgeItemWithTags[]> {
     const itemIds = items.map(item => item.id);
+    if (itemIds.length === 0) return [];
+
     const allTags = await db
       .select({
         knowledgeItemId: knowledgeItemTags.knowledgeItemId,
@@ -166,10 +332,24 @@ export class DatabaseStorage implements IStorage {
     }));
   }
 
+  // Cheap change marker for the user's item set: any insert, delete, or
+  // update moves max(updated_at) or the count, so it works as an ETag input
+  // at a fraction of the cost of serializing the page itself
+  async getKnowledgeItemsVersion(userId: string): Promise<string> {
+    const [row] = await db
+      .select({
+        maxUpdatedAt: sql<string | null>`max(${knowledgeItems.updatedAt})`,
+        count: sql<number>`count(*)::int`,
+      })
+      .from(knowledgeItems)
+      .where(eq(knowledgeItems.userId, userId));
+    return `${row.maxUpdatedAt ?? "0"}:${row.count}`;
+  }
+
   async updateKnowledgeItem(id: string, updates: Partial<InsertKnowledgeItem>): Promise<KnowledgeItem | undefined> {
     const [updated] = await db
       .update(knowledgeItems)
-      .set({ ...updates, updatedAt: new Date() })
+      .set({ ...updates, updatedAt: sql`now()` })
       .where(eq(knowledgeItems.id, id))
       .returning();
     return updated;
@@ -184,51 +364,45 @@ export class DatabaseStorage implements IStorage {
 
   async searchKnowledgeItems(userId: string, query: string): Promise<KnowledgeItemWithTags[]> {
     const searchTerm = `%${query.toLowerCase()}%`;
-    
-    const items = await db
-      .select()
-      .from(knowledgeItems)
-      .where(
-        and(
-          eq(knowledgeItems.userId, userId),
-          or(
-            ilike(knowledgeItems.title, searchTerm),
-            ilike(knowledgeItems.summary, searchTerm),
-            ilike(knowledgeItems.content, searchTerm)
-          )
-        )
-      )
-      .orderBy(desc(knowledgeItems.createdAt));
 
-    // Get tags for search results
-    const itemIds = items.map(item => item.id);
-    if (itemIds.length === 0) return [];
-
-    const allTags = await db
-      .select({
-        knowledgeItemId: knowledgeItemTags.knowledgeItemId,
-        tagId: knowledgeItemTags.tagId,
-        tag: tags,
-      })
-      .from(knowledgeItemTags)
-      .innerJoin(tags, eq(knowledgeItemTags.tagId, tags.id))
-      .where(inArray(knowledgeItemTags.knowledgeItemId, itemIds));
+    // Full-text arm and title arm run as separate queries: OR-ing the
+    // tsvector predicate with a leading-wildcard ILIKE in one query keeps
+    // the planner off the GIN expression index and evaluates to_tsvector
+    // per row in a seq scan. Standing alone, the full-text arm is served
+    // by the index (the to_tsvector expression must match the index
+    // definition exactly); the ILIKE arm only touches short titles, so
+    // partial-word queries still match cheaply.
+    const [ftsItems, titleItems] = await Promise.all([
+      db
+        .select()
+        .from(knowledgeItems)
+        .where(
+          and(
+            eq(knowledgeItems.userId, userId),
+            sql`to_tsvector('english', coalesce(${knowledgeItems.title}, '') || ' ' || coalesce(${knowledgeItems.summary}, '') || ' ' || coalesce(${knowledgeItems.content}, '')) @@ plainto_tsquery('english', ${query})`
+          )
+        ),
+      db
+        .select()
+        .from(knowledgeItems)
+        .where(
+          and(
+            eq(knowledgeItems.userId, userId),
+            ilike(knowledgeItems.title, searchTerm)
+          )
+        ),
+    ]);
 
-    // Group tags by knowledge item
-    const tagsByItem = allTags.reduce((acc, t) => {
-      if (!acc[t.knowledgeItemId]) acc[t.knowledgeItemId] = [];
-      acc[t.knowledgeItemId].push({
-        knowledgeItemId: t.knowledgeItemId,
-        tagId: t.tagId,
-        tag: t.tag!,
-      });
-      return acc;
-    }, {} as Record<string, any[]>);
+    // Union the arms, dropping rows both matched, newest first
+    const byId = new Map<string, KnowledgeItem>();
+    for (const item of [...ftsItems, ...titleItems]) {
+      byId.set(item.id, item);
+    }
+    const items = Array.from(byId.values()).sort(
+      (a, b) => (b.createdAt?.getTime() ?? 0) - (a.createdAt?.getTime() ?? 0),
+    );
 
-    return items.map(item => ({
-      ...item,
-      knowledgeItemTags: tagsByItem[item.id] || [],
-    }));
+    return await this.attachTags(items);
   }
 
   // Enhanced search with type filtering and tag search
@@ -328,6 +502,7 @@ export class DatabaseStorage implements IStorage {
       .insert(tags)
       .values(tag)
       .returning();
+    this.userTagsCache.delete(tag.userId);
     return newTag;
   }
 
@@ -342,18 +517,34 @@ export class DatabaseStorage implements IStorage {
   async getOrCreateTags(userId: string, tagNames: string[]): Promise<Tag[]> {
     if (tagNames.length === 0) return [];
 
-    // Get all existing tags for the user
-    const allExistingTags = await db
-      .select()
-      .from(tags)
-      .where(eq(tags.userId, userId));
+    const allExistingTags = await this.getUserTags(userId);
+    const { matched, toCreate } = this.matchTags(tagNames, allExistingTags);
+    const resultTags = [...matched];
 
-    const resultTags: Tag[] = [];
-    const tagsToCreate: string[] = [];
+    // Create all missing tags in one bulk insert instead of paying a
+    // round-trip per tag
+    if (toCreate.length > 0) {
+      const newTags = await this.insertMissingTags(db, userId, toCreate);
+      resultTags.push(...newTags);
+      this.userTagsCache.set(userId, [...allExistingTags, ...newTags]);
+    }
+
+    return resultTags;
+  }
+
+  // Resolve suggested tag names against the user's existing tags (exact
+  // match first, then similarity), splitting them into reusable matches and
+  // names that still need creating
+  private matchTags(
+    tagNames: string[],
+    allExistingTags: Tag[],
+  ): { matched: Tag[]; toCreate: string[] } {
+    const matched: Tag[] = [];
+    const toCreate: string[] = [];
 
     for (const suggestedTagName of tagNames) {
       // First try exact match (case insensitive)
-      let matchedTag = allExistingTags.find(t => 
+      let matchedTag = allExistingTags.find(t =>
         t.name.toLowerCase() === suggestedTagName.toLowerCase()
       );
 
@@ -364,31 +555,18 @@ export class DatabaseStorage implements IStorage {
 
       if (matchedTag) {
         // Use existing similar tag
-        if (!resultTags.find(t => t.id === matchedTag!.id)) {
-          resultTags.push(matchedTag);
+        if (!matched.find(t => t.id === matchedTag!.id)) {
+          matched.push(matchedTag);
         }
       } else {
         // Mark for creation
-        if (!tagsToCreate.includes(suggestedTagName)) {
-          tagsToCreate.push(suggestedTagName);
+        if (!toCreate.includes(suggestedTagName)) {
+          toCreate.push(suggestedTagName);
         }
       }
     }
 
-    // Create new tags
-    for (const tagName of tagsToCreate) {
-      const [newTag] = await db
-        .insert(tags)
-        .values({
-          name: tagName,
-          userId,
-          color: getRandomTagColor(),
-        })
-        .returning();
-      resultTags.push(newTag);
-    }
-
-    return resultTags;
+    return { matched, toCreate };
   }
 
   private findSimilarTag(suggestedName: string, existingTags: Tag[]): Tag | undefined {
@@ -585,7 +763,7 @@ export class DatabaseStorage implements IStorage {
           preferredModel: settings.preferredModel,
           customApiKeys: settings.customApiKeys,
           chatSettings: settings.chatSettings,
-          updatedAt: new Date(),
+          updatedAt: sql`now()`,
         },
       })
       .returning();
@@ -622,12 +800,51 @@ export class DatabaseStorage implements IStorage {
     };
   }
 
-  async getConversationsByUser(userId: string): Promise<Conversation[]> {
-    return await db
+  // Just the conversation row - for ownership checks and metadata reads
+  // that don't need the message history getConversation hauls in
+  async getConversationMeta(id: string): Promise<Conversation | undefined> {
+    const [conversation] = await db
       .select()
       .from(conversations)
+      .where(eq(conversations.id, id))
+      .limit(1);
+    return conversation;
+  }
+
+  async getConversationsByUser(userId: string): Promise<(Conversation & { messageCount: number })[]> {
+    // The count comes from one grouped join; deriving it any other way would
+    // mean shipping every message row just to take its length
+    const rows = await db
+      .select({
+        conversation: conversations,
+        messageCount: sql<number>`count(${chatMessages.id})::int`,
+      })
+      .from(conversations)
+      .leftJoin(chatMessages, eq(chatMessages.conversationId, conversations.id))
       .where(eq(conversations.userId, userId))
+      .groupBy(conversations.id)
       .orderBy(desc(conversations.updatedAt));
+
+    return rows.map(row => ({ ...row.conversation, messageCount: row.messageCount }));
+  }
+
+  // Same change-marker idea as getKnowledgeItemsVersion; new messages bump
+  // the conversation's updatedAt, so they move this value too
+  async getConversationsVersion(userId: string): Promise<string> {
+    // The message count folds into the version because the list payload
+    // exposes messageCount while the conversation updatedAt bump on the
+    // message path is fire-and-forget: a new message must move the version
+    // even when that background bump hasn't landed (or failed).
+    const [row] = await db
+      .select({
+        maxUpdatedAt: sql<string | null>`max(${conversations.updatedAt})`,
+        count: sql<number>`count(distinct ${conversations.id})::int`,
+        messageCount: sql<number>`count(${chatMessages.id})::int`,
+      })
+      .from(conversations)
+      .leftJoin(chatMessages, eq(chatMessages.conversationId, conversations.id))
+      .where(eq(conversations.userId, userId));
+    return `${row.maxUpdatedAt ?? "0"}:${row.count}:${row.messageCount}`;
   }
 
   async deleteConversation(id: string): Promise<boolean> {
@@ -644,11 +861,15 @@ export class DatabaseStorage implements IStorage {
       .values(message)
       .returning();
     
-    // Update conversation's updatedAt timestamp
-    await db
-      .update(conversations)
-      .set({ updatedAt: new Date() })
-      .where(eq(conversations.id, message.conversationId));
+    // Bump the conversation's updatedAt off the response path: it only
+    // affects list ordering, so the caller shouldn't wait on a second
+    // round-trip for it. A lost update costs one stale sort position.
+    db.update(conversations)
+      .set({ updatedAt: sql`now()` })
+      .where(eq(conversations.id, message.conversationId))
+      .catch(error =>
+        console.error("Failed to update conversation timestamp:", error),
+      );
     
     return created;
   }
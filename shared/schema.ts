@@ -1,6 +1,7 @@
 import { sql } from 'drizzle-orm';
 import {
   index,
+  uniqueIndex,
   jsonb,
   pgTable,
   timestamp,
@@ -56,7 +57,17 @@ export const knowledgeItems = pgTable("knowledge_items", {
   processingError: text("processing_error"),
   createdAt: timestamp("created_at").defaultNow(),
   updatedAt: timestamp("updated_at").defaultNow(),
-});
+}, (table) => [
+  // Every list/search query filters by user and sorts by recency
+  index("IDX_knowledge_items_user_created").on(table.userId, table.createdAt),
+  // Full-text search over the searchable text columns; the expression must
+  // stay byte-identical to the one used in searchKnowledgeItems for the
+  // planner to use this index
+  index("IDX_knowledge_items_fts").using(
+    "gin",
+    sql`to_tsvector('english', coalesce(${table.title}, '') || ' ' || coalesce(${table.summary}, '') || ' ' || coalesce(${table.content}, ''))`,
+  ),
+]);
 
 // Tags table
 export const tags = pgTable("tags", {
@@ -65,7 +76,11 @@ export const tags = pgTable("tags", {
   color: varchar("color", { length: 7 }).default("#3B82F6"), // Hex color
   userId: varchar("user_id").notNull().references(() => users.id, { onDelete: "cascade" }),
   createdAt: timestamp("created_at").defaultNow(),
-});
+}, (table) => [
+  // Tag lookups are always per user by name; unique so concurrent
+  // get-or-create calls can't race duplicate tags into existence
+  uniqueIndex("IDX_tags_user_name").on(table.userId, table.name),
+]);
 
 // Knowledge item tags junction table
 export const knowledgeItemTags = pgTable("knowledge_item_tags", {
@@ -94,7 +109,10 @@ export const conversations = pgTable("conversations", {
   title: text("title").notNull(),
   createdAt: timestamp("created_at").defaultNow(),
   updatedAt: timestamp("updated_at").defaultNow(),
-});
+}, (table) => [
+  // The sidebar lists a user's conversations by most recent activity
+  index("IDX_conversations_user_updated").on(table.userId, table.updatedAt),
+]);
 
 // Chat messages table
 export const chatMessages = pgTable("chat_messages", {
@@ -104,7 +122,10 @@ export const chatMessages = pgTable("chat_messages", {
   content: text("content").notNull(),
   metadata: jsonb("metadata"), // Retrieved knowledge items, model used, etc.
   createdAt: timestamp("created_at").defaultNow(),
-});
+}, (table) => [
+  // Conversation history is always read per conversation in send order
+  index("IDX_chat_messages_conversation_created").on(table.conversationId, table.createdAt),
+]);
 
 // Relations
 export const usersRelations = relations(users, ({ many }) => ({